@@ -0,0 +1,129 @@
+"""Admission control for agent invocations.
+
+Each chat turn holds one global slot and one slot of its user while it runs. Requests
+that cannot start immediately wait in a bounded queue; when the queue (or the user's
+share of it) is full, or the wait exceeds ``queue_timeout``, ``AdmissionRejected`` is
+raised and the endpoint answers 429 with a Retry-After estimate.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+CHAT_CONCURRENCY = int(os.getenv('BMO_CHAT_CONCURRENCY', '4'))
+CHAT_PER_USER = int(os.getenv('BMO_CHAT_PER_USER', '1'))
+CHAT_QUEUE = int(os.getenv('BMO_CHAT_QUEUE', '16'))
+CHAT_USER_QUEUE = int(os.getenv('BMO_CHAT_USER_QUEUE', '2'))
+CHAT_QUEUE_TIMEOUT = float(os.getenv('BMO_CHAT_QUEUE_TIMEOUT', '60'))
+
+class AdmissionRejected(Exception):
+    """The request was not admitted; ``retry_after`` is a hint in whole seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionController:
+    def __init__(self, max_concurrent=CHAT_CONCURRENCY, per_user=CHAT_PER_USER, max_queue=CHAT_QUEUE,
+                 user_queue=CHAT_USER_QUEUE, queue_timeout=CHAT_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.per_user = per_user
+        self.max_queue = max_queue
+        self.user_queue = user_queue
+        self.queue_timeout = queue_timeout
+        self._global = asyncio.Semaphore(max_concurrent)
+        self._users = {}  # {user: [semaphore, waiting, holders]}
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._wait_ms = deque(maxlen=500)
+        self._avg_service = 5.0  # seconds, exponential moving average of turn duration
+
+    def retry_after(self):
+        """Seconds until a slot is likely free, from queue depth and average turn duration."""
+        return max(1, math.ceil(self._avg_service * (self.waiting + 1) / self.max_concurrent))
+
+    def _user(self, user):
+        return self._users.setdefault(user, [asyncio.Semaphore(self.per_user), 0, 0])
+
+    def _forget_user(self, user):
+        entry = self._users.get(user)
+        if entry and entry[1] == 0 and entry[2] == 0:
+            del self._users[user]
+
+    async def _acquire(self, semaphore):
+        await semaphore.acquire()
+        try:
+            await self._global.acquire()
+        except BaseException:
+            semaphore.release()
+            raise
+
+    @asynccontextmanager
+    async def slot(self, user):
+        """Hold a global and a per-user slot for the duration of the block."""
+        entry = self._user(user)
+        started = time.perf_counter()
+        if not entry[0].locked() and not self._global.locked():
+            # Both slots are free: take them without queueing (acquire does not suspend here)
+            await self._acquire(entry[0])
+            entry[2] += 1
+        else:
+            if self.waiting >= self.max_queue or entry[1] >= self.user_queue:
+                self.rejected += 1
+                self._forget_user(user)
+                raise AdmissionRejected("The assistant is busy, please retry shortly", self.retry_after())
+
+            self.waiting += 1
+            entry[1] += 1
+            admitted = False
+            try:
+                await asyncio.wait_for(self._acquire(entry[0]), timeout=self.queue_timeout)
+                admitted = True
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise AdmissionRejected("Timed out waiting for the assistant", self.retry_after())
+            finally:
+                self.waiting -= 1
+                entry[1] -= 1
+                if admitted:
+                    entry[2] += 1
+                else:
+                    self._forget_user(user)
+
+        self._wait_ms.append((time.perf_counter() - started) * 1000)
+        self.admitted += 1
+        self.in_flight += 1
+        running = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._avg_service = 0.8 * self._avg_service + 0.2 * (time.perf_counter() - running)
+            self._global.release()
+            entry[0].release()
+            entry[2] -= 1
+            self._forget_user(user)
+
+    def stats(self):
+        waits = sorted(self._wait_ms)
+        return {
+            "max_concurrent": self.max_concurrent,
+            "per_user": self.per_user,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "avg_turn_seconds": round(self._avg_service, 2),
+            "wait_ms": {
+                "avg": round(sum(waits) / len(waits), 2) if waits else 0,
+                "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else 0,
+                "max": round(waits[-1], 2) if waits else 0,
+            },
+        }
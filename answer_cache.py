@@ -0,0 +1,162 @@
+"""Question-level cache in front of the agent.
+
+Questions are normalized (case, punctuation, whitespace) and matched exactly, or by
+cosine similarity of a local hashed bag-of-words vector (stop words removed, plurals
+folded) when ``BMO_ANSWER_CACHE_SIMILARITY`` is above 0. Every entry records the
+database data version it was answered at, so any write to the data tables invalidates it.
+Follow-up questions that lean on earlier turns ("what about that bank?") are never
+answered from the cache, and a similarity match must mention the same numbers.
+"""
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+
+ANSWER_CACHE_SIZE = int(os.getenv('BMO_ANSWER_CACHE_SIZE', '256'))
+ANSWER_CACHE_TTL = float(os.getenv('BMO_ANSWER_CACHE_TTL', '3600'))
+# 0 disables similarity matching (exact normalized text only)
+ANSWER_CACHE_SIMILARITY = float(os.getenv('BMO_ANSWER_CACHE_SIMILARITY', '0.9'))
+# "user": each user only gets answers to their own questions; "global": shared by everyone
+ANSWER_CACHE_SCOPE = os.getenv('BMO_ANSWER_CACHE_SCOPE', 'user')
+EMBEDDING_DIMENSIONS = 512
+
+# Words that do not change what is being asked
+STOP_WORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "were", "be", "there", "do", "does", "did", "have",
+    "has", "had", "of", "for", "in", "on", "to", "me", "us", "please", "show", "list", "tell",
+    "give", "can", "could", "would", "you", "i", "we", "what", "which", "whats", "currently", "now",
+})
+
+# Words that make a question depend on the conversation so far
+CONTEXT_WORDS = frozenset({
+    "it", "its", "that", "those", "these", "this", "them", "they", "their", "he", "she",
+    "above", "previous", "earlier", "same", "again", "else", "more", "another", "other",
+})
+
+def normalize_question(text):
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+def stem(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def question_vector(normalized):
+    """L2-normalized hashed counts of the question's content words; a cheap local stand-in for an embedding.
+
+    Any differing content word ("pending" vs "accepted") pulls the cosine well below the
+    default threshold, while reordering, plurals and filler words do not.
+    """
+    counts = Counter(zlib.crc32(stem(word).encode()) % EMBEDDING_DIMENSIONS
+                     for word in normalized.split() if word not in STOP_WORDS)
+    norm = math.sqrt(sum(value * value for value in counts.values())) or 1.0
+    return {index: value / norm for index, value in counts.items()}
+
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+def is_contextual(normalized):
+    return any(word in CONTEXT_WORDS for word in normalized.split())
+
+class AnswerCache:
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL,
+                 similarity=ANSWER_CACHE_SIMILARITY, scope=ANSWER_CACHE_SCOPE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.scope = scope
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # {(scope_key, normalized): entry}
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+        self.invalidations = 0
+
+    def _scope_key(self, user):
+        return user if self.scope == "user" else None
+
+    def lookup(self, question, user, data_version):
+        """Return ``(entry, similarity)`` for a reusable answer, or ``None``."""
+        normalized = normalize_question(question)
+        if not normalized or is_contextual(normalized):
+            with self._lock:
+                self.skipped += 1
+            return None
+        scope_key = self._scope_key(user)
+        now = time.time()
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if entry["data_version"] != data_version or now - entry["created"] > self.ttl]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+            entry = self._entries.get((scope_key, normalized))
+            score = 1.0
+            if entry is None and self.similarity > 0:
+                vector = question_vector(normalized)
+                numbers = re.findall(r"\d+", normalized)
+                best = None
+                for (key_scope, _), candidate in self._entries.items():
+                    if key_scope != scope_key or candidate["numbers"] != numbers:
+                        continue
+                    candidate_score = cosine(vector, candidate["vector"])
+                    if candidate_score >= self.similarity and (best is None or candidate_score > score):
+                        best, score = candidate, candidate_score
+                entry = best
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((scope_key, entry["normalized"]))
+            self.hits += 1
+            if score < 1.0:
+                self.similar_hits += 1
+            return entry, score
+
+    def store(self, question, user, data_version, result):
+        normalized = normalize_question(question)
+        if not normalized or is_contextual(normalized):
+            return
+        key = (self._scope_key(user), normalized)
+        with self._lock:
+            self._entries[key] = {
+                "question": question,
+                "normalized": normalized,
+                "numbers": re.findall(r"\d+", normalized),
+                "vector": question_vector(normalized),
+                "data_version": data_version,
+                "created": time.time(),
+                "result": result,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.stores += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "scope": self.scope,
+                "similarity_threshold": self.similarity,
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "stores": self.stores,
+                "skipped": self.skipped,
+                "invalidations": self.invalidations,
+            }
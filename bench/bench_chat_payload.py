@@ -0,0 +1,58 @@
+"""Size of the /api/chat reply as a conversation thread grows.
+
+Builds synthetic threads of increasing depth (each turn: a question, a tool call, a tool
+result of ``--result-chars`` characters and an answer) and prints the JSON size of the
+reply the API used to send (the whole graph state, as FastAPI serialized it) next to
+``summarize_turn`` in its compact and verbose forms.
+
+    python bench/bench_chat_payload.py --depths 1 5 10 25 50 --result-chars 4000
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi.encoders import jsonable_encoder
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from mcp_agent import summarize_turn
+
+USAGE = {"input_tokens": 1200, "output_tokens": 150, "total_tokens": 1350}
+
+def build_thread(depth, result_chars):
+    messages = []
+    for turn in range(depth):
+        call_id = f"call-{turn}"
+        rows = [{"id": i, "report_code": f"RPT-{turn:03d}-{i:04d}", "has_errors": i % 2 == 0}
+                for i in range(result_chars // 60 + 1)]
+        messages += [
+            HumanMessage(content=f"Question {turn}: which reports of bank {turn} have errors?"),
+            AIMessage(content="", tool_calls=[{"name": "get_reports", "args": {"bank_id": turn, "has_errors": True},
+                                               "id": call_id}], usage_metadata=USAGE),
+            ToolMessage(content=json.dumps(rows)[:result_chars], name="get_reports", tool_call_id=call_id),
+            AIMessage(content=f"Bank {turn} has {len(rows) // 2} reports with errors.", usage_metadata=USAGE),
+        ]
+    return messages
+
+def payload_size(body):
+    return len(json.dumps(jsonable_encoder(body)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 5, 10, 25, 50], help="turns per thread")
+    parser.add_argument("--result-chars", type=int, default=4000, help="size of each tool result")
+    args = parser.parse_args()
+
+    print(f"{'turns':>6}{'raw state':>14}{'compact':>10}{'verbose':>10}")
+    for depth in args.depths:
+        messages = build_thread(depth, args.result_chars)
+        raw = payload_size({"response": {"messages": messages}})
+        compact = payload_size(summarize_turn(messages))
+        verbose = payload_size(summarize_turn(messages, verbose=True))
+        print(f"{depth:>6}{raw:>14}{compact:>10}{verbose:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Latency of mixed API traffic with SQLite work on the DB executor versus inline.
+
+Serves the same three routes twice on a temporary copy of bmo_data.db (inflated with
+extra reports so a search scan takes a few milliseconds):
+
+- GET /api/reports?search=... - report scan, through ``run_db`` or called inline
+- POST /api/chat - stand-in for an agent turn: awaits ``--chat-ms`` then reads one page
+- WS /ws - echo, used as a ping to measure event-loop responsiveness
+
+and drives them concurrently, then prints p50/p99 per route for each mode.
+
+    python bench/bench_db_executor.py --reports 50000 --clients 16 --seconds 5
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def prepare_database(extra_reports):
+    directory = tempfile.mkdtemp(prefix="bmo-bench-")
+    path = os.path.join(directory, "bmo_data.db")
+    shutil.copy(os.path.join(ROOT, "bmo_data.db"), path)
+    os.environ["BMO_DB_PATH"] = path
+    sys.path.insert(0, ROOT)
+    import database
+    database.init_database()
+    conn = sqlite3.connect(path)
+    bank_ids = [row[0] for row in conn.execute("SELECT id FROM banks")]
+    conn.executemany(
+        "INSERT INTO reports (bank_id, report_code, submission_date, has_errors, is_accepted) VALUES (?, ?, ?, ?, ?)",
+        [(bank_ids[i % len(bank_ids)], f"BENCH-{i:07d}", f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}", i % 3 == 0, None)
+         for i in range(extra_reports)]
+    )
+    conn.commit()
+    conn.close()
+    return directory
+
+def build_app(mode, chat_ms):
+    from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+    import repository
+    from database import db_pool, run_db
+
+    app = FastAPI()
+
+    async def call(func, *args, **kwargs):
+        if mode == "executor":
+            return await run_db(func, *args, **kwargs)
+        with db_pool.connection() as conn:
+            return func(conn, *args, **kwargs)
+
+    @app.get("/api/reports")
+    async def reports(search: str = "BENCH-00"):
+        return await call(repository.list_reports, search=search)
+
+    @app.post("/api/chat")
+    async def chat():
+        await asyncio.sleep(chat_ms / 1000)
+        page = await call(repository.list_reports, limit=10)
+        return {"answer": f"{len(page['reports'])} reports"}
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await websocket.accept()
+        try:
+            while True:
+                await websocket.send_text(await websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+
+    return app
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def run_server(mode, chat_ms, port):
+    import uvicorn
+    sys.path.insert(0, ROOT)
+    uvicorn.run(build_app(mode, chat_ms), host="127.0.0.1", port=port, log_level="warning")
+
+def serve(mode, chat_ms):
+    """Start the app in its own process so the load generator does not share its GIL."""
+    port = free_port()
+    process = multiprocessing.Process(target=run_server, args=(mode, chat_ms, port), daemon=True)
+    process.start()
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Benchmark server did not start")
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else float("nan")
+
+async def drive(port, clients, seconds):
+    import httpx
+    import websockets
+
+    latencies = {"reports": [], "chat": [], "ws": []}
+    deadline = time.perf_counter() + seconds
+    base = f"http://127.0.0.1:{port}"
+
+    async def http_client(route, method, path):
+        async with httpx.AsyncClient(base_url=base, timeout=60) as client:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.request(method, path)
+                response.raise_for_status()
+                latencies[route].append((time.perf_counter() - started) * 1000)
+
+    async def ws_client():
+        async with websockets.connect(f"ws://127.0.0.1:{port}/ws") as websocket:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                await websocket.send("ping")
+                await websocket.recv()
+                latencies["ws"].append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.01)
+
+    tasks = [http_client("reports", "GET", "/api/reports") for _ in range(clients)]
+    tasks += [http_client("chat", "POST", "/api/chat") for _ in range(max(1, clients // 2))]
+    tasks += [ws_client() for _ in range(max(1, clients // 4))]
+    await asyncio.gather(*tasks)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=50000, help="extra reports inserted into the copy")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent /api/reports clients")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--chat-ms", type=float, default=50, help="simulated model latency per chat call")
+    args = parser.parse_args()
+
+    directory = prepare_database(args.reports)
+    try:
+        print(f"{'mode':<10}{'route':<10}{'requests':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for mode in ("inline", "executor"):
+            process, port = serve(mode, args.chat_ms)
+            latencies = asyncio.run(drive(port, args.clients, args.seconds))
+            process.terminate()
+            process.join()
+            for route, samples in latencies.items():
+                print(f"{mode:<10}{route:<10}{len(samples):>10}"
+                      f"{percentile(samples, 0.5):>10.1f}{percentile(samples, 0.99):>10.1f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Cost of loading a report's errors once its comment threads grow long.
+
+On a temporary copy of bmo_data.db, adds ``--comments`` two-line comments to every error
+of the report with the most errors, then times and sizes:
+
+- the previous query: GROUP_CONCAT of every comment, split on newlines in Python (which
+  also breaks multi-line comments apart)
+- ``get_report_errors`` with the default embedded comment limit and with no practical limit
+- reading every comment of one error page by page with ``list_error_comments``
+
+    python bench/bench_error_comments.py --comments 400 --repeat 50
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+OLD_QUERY = """
+    SELECT ve.report_id, ve.id, ve.error_type, ve.error_message, ve.field_name,
+           GROUP_CONCAT(u.username || ': ' || ec.comment || ' (' || ec.created_at || ')', '\n') as comments
+    FROM validation_errors ve
+    LEFT JOIN error_comments ec ON ve.id = ec.error_id
+    LEFT JOIN users u ON ec.user_id = u.id
+    WHERE ve.report_id = ?
+    GROUP BY ve.id
+    ORDER BY ve.report_id, ve.id
+"""
+
+def old_report_errors(conn, report_id):
+    errors = []
+    for row in conn.execute(OLD_QUERY, (report_id,)):
+        error = dict(row)
+        error.pop('report_id')
+        error['comments'] = error['comments'].split('\n') if error['comments'] else []
+        errors.append(error)
+    return errors
+
+def prepare_database(comments_per_error):
+    directory = tempfile.mkdtemp(prefix="bmo-bench-")
+    path = os.path.join(directory, "bmo_data.db")
+    shutil.copy(os.path.join(ROOT, "bmo_data.db"), path)
+    os.environ["BMO_DB_PATH"] = path
+    sys.path.insert(0, ROOT)
+    import database
+    database.init_database()
+    conn = sqlite3.connect(path)
+    report_id = conn.execute(
+        "SELECT report_id FROM validation_errors GROUP BY report_id ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()[0]
+    error_ids = [row[0] for row in conn.execute("SELECT id FROM validation_errors WHERE report_id = ?", (report_id,))]
+    user_id = conn.execute("SELECT MIN(id) FROM users").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO error_comments (error_id, user_id, comment) VALUES (?, ?, ?)",
+        [(error_id, user_id, f"Checked field mapping, round {i}.\nFollow-up requested from the bank.")
+         for error_id in error_ids for i in range(comments_per_error)]
+    )
+    conn.commit()
+    conn.close()
+    return directory, path, report_id, error_ids
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) * 1000 / repeat, result
+
+def all_comment_pages(conn, repository, error_id):
+    pages, cursor = 0, None
+    while True:
+        page = repository.list_error_comments(conn, error_id, limit=repository.MAX_COMMENT_PAGE_SIZE, cursor=cursor)
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=400, help="comments added to each error of the report")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    directory, path, report_id, error_ids = prepare_database(args.comments)
+    try:
+        import repository
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        print(f"report {report_id}: {len(error_ids)} errors, {args.comments} added comments each")
+        print(f"{'variant':<34}{'ms':>8}{'bytes':>10}{'entries':>9}")
+        variants = [
+            ("GROUP_CONCAT (previous)", lambda: old_report_errors(conn, report_id)),
+            (f"get_report_errors (limit {repository.ERROR_COMMENT_LIMIT})",
+             lambda: repository.get_report_errors(conn, report_id)),
+            ("get_report_errors (limit 10000)", lambda: repository.get_report_errors(conn, report_id, 10000)),
+        ]
+        for name, func in variants:
+            ms, errors = timed(func, args.repeat)
+            entries = sum(len(error["comments"]) for error in errors)
+            print(f"{name:<34}{ms:>8.2f}{len(json.dumps(errors)):>10}{entries:>9}")
+        ms, pages = timed(lambda: all_comment_pages(conn, repository, error_ids[0]), args.repeat)
+        print(f"{'list_error_comments, one error':<34}{ms:>8.2f}{'':>10}{pages:>9} pages")
+        conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
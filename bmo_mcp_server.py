@@ -1,21 +1,74 @@
 from typing import Dict, Any, List, Optional
-import requests
-import sqlite3
+import asyncio
+import time
 from fastmcp import FastMCP
+from database import db_pool
+from http_client import AsyncApiClient
 
 mcp = FastMCP("BMO MCP Server")
 BASE_URL = "http://localhost:8000"
+api = AsyncApiClient(BASE_URL)
 
-def get_latest_token() -> Optional[str]:
-    """Get the most recent token from sessions table."""
+class TokenProvider:
+    """Resolves the session token sent to the REST API.
+
+    The BMO assistant injects the caller's own token into every tool call (the hidden
+    ``auth_token`` argument), so concurrent users each act with their own session and no
+    database lookup is needed. Callers that pass no token fall back to the most recently
+    used unexpired row of the ``sessions`` table; that lookup is cached and only refreshed
+    after a 401.
+    """
+
+    def __init__(self):
+        self._fallback = None
+        self._lock = asyncio.Lock()
+        self.lookups = 0
+
+    def _latest_session_token(self) -> Optional[str]:
+        try:
+            with db_pool.connection() as conn:
+                result = conn.execute(
+                    "SELECT token FROM sessions WHERE expires_at > ? ORDER BY last_seen DESC LIMIT 1", (time.time(),)
+                ).fetchone()
+            return result[0] if result else None
+        except Exception:
+            return None
+
+    async def get(self, explicit: Optional[str] = None) -> Optional[str]:
+        if explicit:
+            return explicit
+        if self._fallback is None:
+            async with self._lock:
+                if self._fallback is None:
+                    self.lookups += 1
+                    self._fallback = await asyncio.to_thread(self._latest_session_token)
+        return self._fallback
+
+    async def refresh(self, rejected: str) -> Optional[str]:
+        """Drop a fallback token the API rejected and resolve it again."""
+        async with self._lock:
+            if self._fallback == rejected:
+                self.lookups += 1
+                self._fallback = await asyncio.to_thread(self._latest_session_token)
+        return self._fallback
+
+tokens = TokenProvider()
+
+async def call_bmo_api(method: str, path: str, endpoint: str, auth_token: Optional[str] = None, **kwargs) -> Any:
+    """Call the BMO REST API on the shared async client with the caller's session token."""
+    token = await tokens.get(auth_token)
+    if not token:
+        return {"error": "No active session found"}
     try:
-        conn = sqlite3.connect('bmo_data.db')
-        cursor = conn.cursor()
-        result = cursor.execute("SELECT token FROM sessions ORDER BY rowid DESC LIMIT 1").fetchone()
-        conn.close()
-        return result[0] if result else None
-    except Exception:
-        return None
+        response = await api.request(method, path, endpoint=endpoint, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+        if response.status_code == 401 and not auth_token:
+            # The cached fallback session expired or was logged out; retry once with a fresh one
+            fresh = await tokens.refresh(token)
+            if fresh and fresh != token:
+                response = await api.request(method, path, endpoint=endpoint, headers={"Authorization": f"Bearer {fresh}"}, **kwargs)
+        return response.json()
+    except Exception as e:
+        return {"error": str(e)}
 
 # @mcp.tool()
 # def login_user(username: str, password: str) -> Dict[str, Any]:
@@ -27,7 +80,7 @@ def get_latest_token() -> Optional[str]:
 #         return {"error": str(e)}
 
 @mcp.tool()
-def get_banks() -> List[Dict[str, Any]]:
+async def get_banks(auth_token: Optional[str] = None) -> List[Dict[str, Any]]:
     """Retrieve a comprehensive list of all banks registered in the BMO system.
     
     This tool provides access to the complete bank registry maintained by the Banks Monitoring Office.
@@ -55,37 +108,54 @@ def get_banks() -> List[Dict[str, Any]]:
     retrieve the full list and apply client-side filtering.
     """
     print("[BMO] Getting all banks from the system")
-    token = get_latest_token()
-    if not token:
-        return {"error": "No active session found"}
-    try:
-        response = requests.get(f"{BASE_URL}/api/banks", headers={"Authorization": f"Bearer {token}"})
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
+    return await call_bmo_api("GET", "/api/banks", "GET /api/banks", auth_token=auth_token)
+
+def report_query_params(limit, cursor, bank_id=None, aba_code=None, date_from=None,
+                        date_to=None, has_errors=None, status=None, is_accepted=None) -> Dict[str, Any]:
+    """Build /api/reports query parameters, dropping filters that were not given."""
+    params = {"limit": limit, "cursor": cursor, "bank_id": bank_id, "aba_code": aba_code,
+              "date_from": date_from, "date_to": date_to, "has_errors": has_errors, "status": status,
+              "is_accepted": is_accepted}
+    return {key: value for key, value in params.items() if value is not None}
 
 @mcp.tool()
-def get_reports() -> List[Dict[str, Any]]:
-    """Retrieve all bank reports submitted to the BMO system for validation and review.
-    
-    This tool provides access to the complete repository of regulatory reports submitted by
+async def get_reports(bank_id: Optional[int] = None, aba_code: Optional[str] = None,
+                      date_from: Optional[str] = None, date_to: Optional[str] = None,
+                      has_errors: Optional[bool] = None, status: Optional[str] = None,
+                      is_accepted: Optional[bool] = None, limit: int = 50, cursor: Optional[str] = None,
+                      auth_token: Optional[str] = None) -> Dict[str, Any]:
+    """Retrieve bank reports submitted to the BMO system, filtered server-side and paginated.
+    
+    This tool provides access to the repository of regulatory reports submitted by
     monitored banks. Reports include submission metadata, validation status, and approval information.
+    Always pass the narrowest filters that answer the question instead of pulling every report.
+    
+    Parameters (all optional):
+    - bank_id: Only reports from this bank (use get_banks() to find IDs)
+    - aba_code: Only reports from the bank with this 9-digit ABA routing number
+    - date_from / date_to: Inclusive submission date bounds in YYYY-MM-DD format
+    - has_errors: true for reports with validation errors, false for clean reports
+    - status: 'accepted', 'rejected' (rejected and has errors) or 'pending'
+    - is_accepted: true for accepted, false for every rejected report with or without errors
+    - limit: Page size, 1-500 (default 50)
+    - cursor: The next_cursor value from a previous call, to fetch the following page
     
     Returns:
-    List of report objects, each containing:
-    - id: Unique report identifier for system operations
-    - report_code: Bank-generated report reference code
-    - submission_date: When the report was submitted (ISO format)
-    - has_errors: Boolean indicating if validation errors were found
-    - is_accepted: Approval status (true=accepted, false=rejected, null=pending)
-    - aba_code: ABA routing number of the submitting bank
-    - bank_name: Full name of the submitting bank
+    - reports: List of report objects, newest first, each containing:
+        - id: Unique report identifier for system operations
+        - report_code: Bank-generated report reference code
+        - submission_date: When the report was submitted (ISO format)
+        - has_errors: Boolean indicating if validation errors were found
+        - is_accepted: Approval status (true=accepted, false=rejected, null=pending)
+        - aba_code: ABA routing number of the submitting bank
+        - bank_name: Full name of the submitting bank
+    - next_cursor: Pass as cursor to get the next page; null when there are no more reports
+    - limit: Page size that was applied
     
     Use cases:
-    - Dashboard overview of all report submissions
+    - Dashboard overview of report submissions
     - Monitoring report processing pipeline status
     - Identifying reports requiring analyst attention
-    - Generating compliance and processing statistics
     - Finding specific reports for detailed review
     
     Report status interpretation:
@@ -93,20 +163,17 @@ def get_reports() -> List[Dict[str, Any]]:
     - has_errors=true, is_accepted=false: Reports with validation issues, rejected
     - has_errors=true/false, is_accepted=null: Reports awaiting analyst review
     
-    For filtered views, use get_reports_by_status() instead.
+    For counts and statistics, prefer SQL aggregation over paging through every report.
     """
-    print("[BMO] Retrieving all bank reports")
-    token = get_latest_token()
-    if not token:
-        return {"error": "No active session found"}
-    try:
-        response = requests.get(f"{BASE_URL}/api/reports", headers={"Authorization": f"Bearer {token}"})
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
+    print("[BMO] Retrieving bank reports")
+    params = report_query_params(limit, cursor, bank_id, aba_code, date_from, date_to, has_errors, status, is_accepted)
+    return await call_bmo_api("GET", "/api/reports", "GET /api/reports", params=params, auth_token=auth_token)
 
 @mcp.tool()
-def get_reports_by_status(status: str) -> List[Dict[str, Any]]:
+async def get_reports_by_status(status: str, bank_id: Optional[int] = None, aba_code: Optional[str] = None,
+                                date_from: Optional[str] = None, date_to: Optional[str] = None,
+                                has_errors: Optional[bool] = None, limit: int = 50,
+                                cursor: Optional[str] = None, auth_token: Optional[str] = None) -> Dict[str, Any]:
     """Get bank reports filtered by status. 
     
     Parameters:
@@ -114,21 +181,53 @@ def get_reports_by_status(status: str) -> List[Dict[str, Any]]:
         - 'accepted': Reports that have been approved
         - 'rejected': Reports that have been rejected (have errors and is_accepted=false)
         - 'pending': Reports that are awaiting review (is_accepted=null)
+    - bank_id, aba_code, date_from, date_to, has_errors: Optional extra filters, as in get_reports()
+    - limit: Page size, 1-500 (default 50)
+    - cursor: The next_cursor value from a previous call, to fetch the following page
     
-    Returns list of reports with bank information including id, report_code, submission_date, has_errors, is_accepted, aba_code, and bank_name.
+    Returns {"reports": [...], "next_cursor": ..., "limit": ...} where each report includes id,
+    report_code, submission_date, has_errors, is_accepted, aba_code, and bank_name.
     """
     print(f"[BMO] Getting reports filtered by status: {status}")
-    token = get_latest_token()
-    if not token:
-        return {"error": "No active session found"}
-    try:
-        response = requests.get(f"{BASE_URL}/api/reports/status/{status}", headers={"Authorization": f"Bearer {token}"})
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
+    params = report_query_params(limit, cursor, bank_id, aba_code, date_from, date_to, has_errors)
+    return await call_bmo_api("GET", f"/api/reports/status/{status}", "GET /api/reports/status/{status}", params=params, auth_token=auth_token)
 
 @mcp.tool()
-def get_report_errors(report_id: int) -> List[Dict[str, Any]]:
+async def get_report_statistics(auth_token: Optional[str] = None) -> Dict[str, Any]:
+    """Retrieve precomputed dashboard statistics for all reports, banks and validation errors.
+    
+    Counts are maintained incrementally by the database as reports, errors and comments change,
+    so this call is cheap regardless of how many reports exist. Use it for any counting or
+    rate question instead of paging through get_reports() and counting results yourself.
+    
+    Returns:
+    - reports: Overall counts
+        - total, pending, accepted, rejected, with_errors
+        - acceptance_rate: accepted / (total - pending), null if nothing has been decided yet
+    - banks: Number of monitored banks
+    - errors:
+        - total: Number of validation errors
+        - comments: Number of analyst comments on errors
+        - by_type: List of {"error_type", "errors", "comments"}, most frequent first
+    - by_bank: One entry per bank, most errors first, containing bank_id, aba_code, bank_name,
+      reports, pending, accepted, rejected, with_errors, errors and acceptance_rate
+    
+    pending, accepted and rejected split reports by decision and add up to total: rejected
+    counts every report marked not accepted, with or without validation errors (like
+    get_reports(is_accepted=false)), pending counts reports not yet reviewed.
+    
+    Use cases:
+    - "How many reports are pending review?"
+    - "Which bank has the most validation errors?"
+    - "What is the most common error type?"
+    - Acceptance rates overall or per bank
+    """
+    print("[BMO] Getting report statistics")
+    return await call_bmo_api("GET", "/api/stats", "GET /api/stats", auth_token=auth_token)
+
+@mcp.tool()
+async def get_report_errors(report_id: int, comment_limit: Optional[int] = None,
+                            auth_token: Optional[str] = None) -> List[Dict[str, Any]]:
     """Retrieve detailed validation errors for a specific bank report.
     
     This tool provides comprehensive error information for reports that failed BMO validation
@@ -136,14 +235,18 @@ def get_report_errors(report_id: int) -> List[Dict[str, Any]]:
     
     Parameters:
     - report_id: Unique identifier of the report to examine. Use get_reports() to find report IDs.
+    - comment_limit: Optional. Comments returned per error, oldest first (default 20, max 500; 0 for none)
     
     Returns:
     List of error objects, each containing:
     - id: Unique error identifier for comment operations
     - error_type: Category of validation failure (e.g., "Data Format", "Missing Field")
-    - description: Detailed explanation of the validation issue
+    - error_message: Detailed explanation of the validation issue
     - field_name: Specific data field that caused the error (if applicable)
-    - comments: List of analyst comments and notes about this error
+    - comments: List of analyst comments, each {"id", "username", "comment", "created_at"}
+    - comment_count: Total number of comments on this error
+    - comments_next_cursor: Pass to list_error_comments() to read the comments beyond
+      comment_limit; null when all comments are included
     
     Use cases:
     - Detailed error analysis for report rejection decisions
@@ -165,17 +268,38 @@ def get_report_errors(report_id: int) -> List[Dict[str, Any]]:
     4. Use update_report_status() to accept/reject after review
     """
     print(f"[BMO] Getting validation errors for report ID: {report_id}")
-    token = get_latest_token()
-    if not token:
-        return {"error": "No active session found"}
-    try:
-        response = requests.get(f"{BASE_URL}/api/reports/{report_id}/errors", headers={"Authorization": f"Bearer {token}"})
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
+    params = {"comment_limit": comment_limit} if comment_limit is not None else None
+    return await call_bmo_api("GET", f"/api/reports/{report_id}/errors", "GET /api/reports/{report_id}/errors",
+                              params=params, auth_token=auth_token)
 
 @mcp.tool()
-def add_error_comment(error_id: int, comment: str) -> Dict[str, Any]:
+async def list_error_comments(error_id: int, limit: int = 50, cursor: Optional[str] = None,
+                              auth_token: Optional[str] = None) -> Dict[str, Any]:
+    """Page through the analyst comments on one validation error, oldest first.
+    
+    get_report_errors() only includes the first comments of each error; use this tool for
+    errors with long comment threads (comment_count larger than the comments returned).
+    
+    Parameters:
+    - error_id: Error ID from get_report_errors()
+    - limit: Comments per page (default 50, max 500)
+    - cursor: The error's comments_next_cursor, or next_cursor from the previous page.
+      Omit to start from the first comment.
+    
+    Returns:
+    - comments: List of {"id", "username", "comment", "created_at"}
+    - next_cursor: Pass as cursor to get the next page; null on the last page
+    - limit: Page size used
+    """
+    print(f"[BMO] Listing comments for error ID: {error_id}")
+    params = {"limit": limit}
+    if cursor:
+        params["cursor"] = cursor
+    return await call_bmo_api("GET", f"/api/errors/{error_id}/comments", "GET /api/errors/{error_id}/comments",
+                              params=params, auth_token=auth_token)
+
+@mcp.tool()
+async def add_error_comment(error_id: int, comment: str, auth_token: Optional[str] = None) -> Dict[str, Any]:
     """Add analyst comments and notes to specific validation errors.
     
     This tool enables BMO analysts to document their review process, provide feedback
@@ -216,17 +340,11 @@ def add_error_comment(error_id: int, comment: str) -> Dict[str, Any]:
     4. Banks can view comments to understand required corrections
     """
     print(f"[BMO] Adding comment to error ID {error_id}: {comment[:50]}...")
-    token = get_latest_token()
-    if not token:
-        return {"error": "No active session found"}
-    try:
-        response = requests.post(f"{BASE_URL}/api/errors/{error_id}/comments", json={"comment": comment}, headers={"Authorization": f"Bearer {token}"})
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
+    return await call_bmo_api("POST", f"/api/errors/{error_id}/comments", "POST /api/errors/{error_id}/comments",
+                        json={"comment": comment}, auth_token=auth_token)
 
 @mcp.tool()
-def update_report_status(report_id: int, is_accepted: bool) -> Dict[str, Any]:
+async def update_report_status(report_id: int, is_accepted: bool, auth_token: Optional[str] = None) -> Dict[str, Any]:
     """Make final acceptance or rejection decisions on bank reports after validation review.
     
     This tool represents the culmination of the BMO review process, where analysts make
@@ -269,17 +387,69 @@ def update_report_status(report_id: int, is_accepted: bool) -> Dict[str, Any]:
     Accepted reports are considered compliant for regulatory purposes.
     """
     print(f"[BMO] Updating report {report_id} status to: {'ACCEPTED' if is_accepted else 'REJECTED'}")
-    token = get_latest_token()
-    if not token:
-        return {"error": "No active session found"}
-    try:
-        response = requests.put(f"{BASE_URL}/api/reports/{report_id}/status", json={"is_accepted": is_accepted}, headers={"Authorization": f"Bearer {token}"})
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
+    return await call_bmo_api("PUT", f"/api/reports/{report_id}/status", "PUT /api/reports/{report_id}/status",
+                        json={"is_accepted": is_accepted}, auth_token=auth_token)
+
+@mcp.tool()
+async def get_errors_for_reports(report_ids: List[int], auth_token: Optional[str] = None) -> Dict[str, Any]:
+    """Retrieve validation errors for many reports in a single call.
+    
+    Prefer this over calling get_report_errors() once per report when reviewing several
+    reports (up to 500 per call).
+    
+    Parameters:
+    - report_ids: List of report IDs. Use get_reports() to find them.
+    
+    Returns:
+    - reports: List of {"report_id": ..., "errors": [...]} in the order requested, where each
+      error has the same fields as get_report_errors() (id, error_type, error_message,
+      field_name, comments, comment_count, comments_next_cursor). Reports without errors
+      have an empty list.
+    """
+    print(f"[BMO] Getting validation errors for {len(report_ids)} reports")
+    return await call_bmo_api("POST", "/api/reports/errors:batch", "POST /api/reports/errors:batch",
+                              json={"report_ids": report_ids}, auth_token=auth_token)
 
 @mcp.tool()
-def create_bank(aba_code: str, name: str) -> Dict[str, Any]:
+async def update_report_statuses(updates: List[Dict[str, Any]], auth_token: Optional[str] = None) -> Dict[str, Any]:
+    """Accept or reject many reports in a single call and a single database transaction.
+    
+    Prefer this over calling update_report_status() once per report when triaging a batch
+    (up to 500 decisions per call). The same rules apply: reports with validation errors
+    cannot be accepted.
+    
+    Parameters:
+    - updates: List of {"report_id": int, "is_accepted": bool}
+    
+    Returns:
+    - success: True if every update was applied
+    - updated: IDs of reports whose status was changed
+    - failed: List of {"report_id", "error"} for updates that were skipped
+    """
+    print(f"[BMO] Updating status of {len(updates)} reports")
+    return await call_bmo_api("PUT", "/api/reports/status:batch", "PUT /api/reports/status:batch",
+                              json={"updates": updates}, auth_token=auth_token)
+
+@mcp.tool()
+async def add_error_comments(comments: List[Dict[str, Any]], auth_token: Optional[str] = None) -> Dict[str, Any]:
+    """Add many analyst comments to validation errors in a single call.
+    
+    Prefer this over calling add_error_comment() repeatedly (up to 500 comments per call).
+    
+    Parameters:
+    - comments: List of {"error_id": int, "comment": str}
+    
+    Returns:
+    - success: True if every comment was added
+    - added: Number of comments inserted
+    - failed: List of {"error_id", "error"} for comments whose error ID does not exist
+    """
+    print(f"[BMO] Adding {len(comments)} error comments")
+    return await call_bmo_api("POST", "/api/errors/comments:batch", "POST /api/errors/comments:batch",
+                              json={"comments": comments}, auth_token=auth_token)
+
+@mcp.tool()
+async def create_bank(aba_code: str, name: str, auth_token: Optional[str] = None) -> Dict[str, Any]:
     """Create a new bank in the BMO system.
     
     This tool allows BMO analysts to register a new bank that will be monitored by the organization.
@@ -302,19 +472,11 @@ def create_bank(aba_code: str, name: str) -> Dict[str, Any]:
     - Expanding the list of financial institutions under BMO oversight
     """
     print(f"[BMO] Creating new bank: {name} (ABA: {aba_code})")
-    token = get_latest_token()
-    if not token:
-        return {"error": "No active session found"}
-    try:
-        response = requests.post(f"{BASE_URL}/api/banks", 
-                               json={"aba_code": aba_code, "name": name}, 
-                               headers={"Authorization": f"Bearer {token}"})
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
+    return await call_bmo_api("POST", "/api/banks", "POST /api/banks",
+                        json={"aba_code": aba_code, "name": name}, auth_token=auth_token)
 
 @mcp.tool()
-def update_bank(bank_id: int, aba_code: str, name: str) -> Dict[str, Any]:
+async def update_bank(bank_id: int, aba_code: str, name: str, auth_token: Optional[str] = None) -> Dict[str, Any]:
     """Update an existing bank's information in the BMO system.
     
     This tool allows BMO analysts to modify bank details when there are changes to the bank's
@@ -340,19 +502,11 @@ def update_bank(bank_id: int, aba_code: str, name: str) -> Dict[str, Any]:
     Note: Before updating, use get_banks() to retrieve current bank information and confirm the bank_id.
     """
     print(f"[BMO] Updating bank ID {bank_id}: {name} (ABA: {aba_code})")
-    token = get_latest_token()
-    if not token:
-        return {"error": "No active session found"}
-    try:
-        response = requests.put(f"{BASE_URL}/api/banks/{bank_id}", 
-                              json={"aba_code": aba_code, "name": name}, 
-                              headers={"Authorization": f"Bearer {token}"})
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
+    return await call_bmo_api("PUT", f"/api/banks/{bank_id}", "PUT /api/banks/{bank_id}",
+                        json={"aba_code": aba_code, "name": name}, auth_token=auth_token)
 
 @mcp.tool()
-def delete_bank(bank_id: int) -> Dict[str, Any]:
+async def delete_bank(bank_id: int, auth_token: Optional[str] = None) -> Dict[str, Any]:
     """Delete a bank from the BMO system.
     
     This tool removes a bank from the BMO monitoring system. This is a permanent action that
@@ -381,7 +535,7 @@ def delete_bank(bank_id: int) -> Dict[str, Any]:
     
     Workflow:
     1. Use get_banks() to find the bank and confirm the bank_id
-    2. Check if bank has reports using get_reports() filtered by bank name
+    2. Check if bank has reports using get_reports(bank_id=...) with limit=1
     3. Only proceed with deletion if no reports exist
     4. Consider archiving instead of deleting for banks with historical data
     
@@ -389,18 +543,10 @@ def delete_bank(bank_id: int) -> Dict[str, Any]:
     should be marked as inactive rather than deleted to preserve historical data.
     """
     print(f"[BMO] Deleting bank ID: {bank_id}")
-    token = get_latest_token()
-    if not token:
-        return {"error": "No active session found"}
-    try:
-        response = requests.delete(f"{BASE_URL}/api/banks/{bank_id}", 
-                                 headers={"Authorization": f"Bearer {token}"})
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
+    return await call_bmo_api("DELETE", f"/api/banks/{bank_id}", "DELETE /api/banks/{bank_id}", auth_token=auth_token)
 
 @mcp.tool()
-def send_chat_message(message: str) -> Dict[str, Any]:
+async def send_chat_message(message: str, auth_token: Optional[str] = None) -> Dict[str, Any]:
     """Send messages through the BMO internal communication system.
     
     This tool enables analysts to communicate within the BMO system, share information
@@ -435,14 +581,23 @@ def send_chat_message(message: str) -> Dict[str, Any]:
     Note: Messages are logged and may be subject to compliance monitoring and audit requirements.
     """
     print(f"[BMO] Sending chat message: {message[:50]}...")
-    token = get_latest_token()
-    if not token:
-        return {"error": "No active session found"}
-    try:
-        response = requests.post(f"{BASE_URL}/api/chat", json={"message": message}, headers={"Authorization": f"Bearer {token}"})
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
+    return await call_bmo_api("POST", "/api/chat", "POST /api/chat", json={"message": message}, auth_token=auth_token)
+
+@mcp.tool()
+async def get_api_client_metrics() -> Dict[str, Any]:
+    """Report latency statistics for the BMO REST API calls made by these tools.
+    
+    Returns, per endpoint: calls, errors (5xx or connection failures), avg_ms, p50_ms, p95_ms and max_ms.
+    Also returns etag_cache: how many GET calls were answered 304 Not Modified from the
+    client's cached copy (not_modified) versus re-downloaded because the data changed (modified).
+    Useful for diagnosing slow tool responses.
+    """
+    print("[BMO] Getting API client metrics")
+    return {
+        "endpoints": api.metrics.snapshot(),
+        "etag_cache": api.etags.stats() if api.etags else None,
+        "fallback_token_lookups": tokens.lookups,
+    }
 
 if __name__ == "__main__":
     mcp.run(transport="sse", port=9008)
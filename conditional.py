@@ -0,0 +1,39 @@
+"""Conditional GET for list endpoints.
+
+A response's ETag is derived from its URL and the ``table_versions`` write counters of
+the tables it reads, so revalidating costs one small query and no serialization. A
+client sending a current ``If-None-Match`` gets 304 without the list being loaded.
+"""
+import hashlib
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from database import get_table_versions, run_db
+
+# Clients may keep a response but must revalidate it with If-None-Match before each use
+CONDITIONAL_CACHE_CONTROL = "private, no-cache"
+
+def response_etag(request, versions):
+    """Weak ETag for this URL (path and query) at the given table write counters."""
+    key = f"{request.url.path}?{request.url.query}|{sorted(versions.items())}"
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+async def conditional_get(request, tables, load):
+    """Answer 304 without calling ``load`` when the client's ETag is current.
+
+    The counters are read before the query, so a write landing in between only makes the
+    ETag older than the body; the next request then misses and refetches.
+    """
+    versions = await run_db(get_table_versions, tables)
+    etag = response_etag(request, versions)
+    headers = {"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(jsonable_encoder(await load()), headers=headers)
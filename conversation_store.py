@@ -0,0 +1,193 @@
+"""Conversation state for ``MCPAgent``.
+
+``ConversationStore`` owns the LangGraph checkpointer (SQLite in WAL mode on its own
+database file, or in-memory) and bounds it: threads idle longer than ``ttl`` are purged,
+and ``compact_history`` drops the oldest turns once a thread exceeds its token budget.
+
+The in-memory checkpointer holds every thread in process memory, so it is also capped at
+``max_threads``, evicting the least recently used. SQLite checkpoints cost no memory and
+are only deleted by the TTL purge or a logout; their activity lives in the
+``thread_activity`` table, so the purge sees the threads of every worker process sharing
+the file.
+"""
+import itertools
+import os
+import time
+from collections import OrderedDict
+
+import aiosqlite
+from langchain_core.messages import RemoveMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+CHECKPOINTER = os.getenv('BMO_CHECKPOINTER', 'sqlite')  # sqlite | memory
+CHECKPOINT_DB_PATH = os.getenv('BMO_CHECKPOINT_DB', 'bmo_checkpoints.db')
+MAX_THREADS = int(os.getenv('BMO_CHAT_MAX_THREADS', '500'))
+THREAD_TTL = float(os.getenv('BMO_CHAT_THREAD_TTL', str(7 * 24 * 3600)))
+HISTORY_TOKEN_BUDGET = int(os.getenv('BMO_CHAT_HISTORY_TOKENS', '12000'))
+# Seconds between idle-thread sweeps, run opportunistically from touch()
+PURGE_INTERVAL = 300
+
+def compaction_cut(messages, budget):
+    """Index of the first message to keep so the rest fits in ``budget`` tokens.
+
+    Cuts only at human messages so a kept turn never starts with an orphaned tool
+    result; the latest turn is always kept even if it alone exceeds the budget.
+    Returns 0 when nothing needs to be dropped.
+    """
+    sizes = [count_tokens_approximately([message]) for message in messages]
+    if sum(sizes) <= budget:
+        return 0
+    boundaries = [i for i, message in enumerate(messages) if message.type == "human"]
+    if len(boundaries) < 2:
+        return 0
+    remaining = sum(sizes)
+    previous = 0
+    for boundary in boundaries[1:]:
+        remaining -= sum(sizes[previous:boundary])
+        previous = boundary
+        if remaining <= budget:
+            return boundary
+    return boundaries[-1]
+
+class ConversationStore:
+    """Checkpointer plus per-thread bookkeeping; thread ids are session tokens."""
+
+    def __init__(self, backend=CHECKPOINTER, path=CHECKPOINT_DB_PATH, max_threads=MAX_THREADS,
+                 ttl=THREAD_TTL, history_token_budget=HISTORY_TOKEN_BUDGET):
+        self.backend = backend
+        self.path = path
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self.history_token_budget = history_token_budget
+        self.saver = None
+        self._conn = None
+        # {thread_id: last_used}, least recently used first; only for the in-memory checkpointer
+        self._threads = OrderedDict()
+        self._thread_count = 0
+        self._last_purge = 0.0
+        self.evicted = 0
+        self.expired = 0
+        self.compactions = 0
+        self.compacted_messages = 0
+
+    async def open(self):
+        """Create the checkpointer and count stored threads; returns the saver."""
+        if self.backend == "memory":
+            self.saver = InMemorySaver()
+        elif self.backend == "sqlite":
+            self._conn = await aiosqlite.connect(self.path)
+            await self._conn.execute("PRAGMA journal_mode=WAL")
+            await self._conn.execute("PRAGMA synchronous=NORMAL")
+            await self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS thread_activity (
+                    thread_id TEXT PRIMARY KEY,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            await self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_thread_activity_last_used ON thread_activity (last_used)"
+            )
+            await self._conn.commit()
+            self.saver = AsyncSqliteSaver(self._conn)
+            await self.saver.setup()
+        else:
+            raise ValueError(f"Unknown checkpointer backend: {self.backend}")
+        self._thread_count = await self.count_threads()
+        print(f"Conversation store: {self.backend}, {self._thread_count} threads")
+        await self.purge_expired()
+        return self.saver
+
+    async def touch(self, thread_id):
+        """Mark a thread as used now; in memory, evict the least recently used threads over the cap."""
+        now = time.time()
+        if self._conn is None:
+            if thread_id not in self._threads:
+                self._thread_count += 1
+            self._threads[thread_id] = now
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self.max_threads:
+                await self.delete(next(iter(self._threads)))
+                self.evicted += 1
+        else:
+            cursor = await self._conn.execute(
+                "UPDATE thread_activity SET last_used = ? WHERE thread_id = ?", (now, thread_id)
+            )
+            if cursor.rowcount == 0:
+                await self._conn.execute(
+                    "INSERT OR REPLACE INTO thread_activity (thread_id, last_used) VALUES (?, ?)", (thread_id, now)
+                )
+                self._thread_count += 1
+            await self._conn.commit()
+
+        if now - self._last_purge > PURGE_INTERVAL:
+            await self.purge_expired(now)
+
+    async def purge_expired(self, now=None):
+        now = now or time.time()
+        self._last_purge = now
+        expired = await self.idle_threads(now - self.ttl)
+        for thread_id in expired:
+            await self.delete(thread_id)
+        self.expired += len(expired)
+        # Other workers add and purge threads too; resync the count on each sweep
+        self._thread_count = await self.count_threads()
+        if expired:
+            print(f"Purged {len(expired)} idle conversation threads")
+
+    async def count_threads(self):
+        if self._conn is None:
+            return len(self._threads)
+        async with self._conn.execute("SELECT COUNT(*) FROM thread_activity") as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def idle_threads(self, cutoff):
+        """Threads last used before ``cutoff``."""
+        if self._conn is None:
+            return list(itertools.takewhile(lambda thread_id: self._threads[thread_id] < cutoff, self._threads))
+        async with self._conn.execute(
+            "SELECT thread_id FROM thread_activity WHERE last_used < ?", (cutoff,)
+        ) as cursor:
+            return [row[0] async for row in cursor]
+
+    async def delete(self, thread_id):
+        known = self._threads.pop(thread_id, None) is not None
+        await self.saver.adelete_thread(thread_id)
+        if self._conn is not None:
+            cursor = await self._conn.execute("DELETE FROM thread_activity WHERE thread_id = ?", (thread_id,))
+            known = cursor.rowcount > 0
+            await self._conn.commit()
+        if known:
+            self._thread_count -= 1
+
+    async def compact_history(self, agent, config):
+        """Drop the oldest turns of the thread in ``config`` once it exceeds the token budget."""
+        state = await agent.aget_state(config)
+        messages = state.values.get("messages", [])
+        cut = compaction_cut(messages, self.history_token_budget)
+        if not cut:
+            return 0
+        await agent.aupdate_state(config, {"messages": [RemoveMessage(id=m.id) for m in messages[:cut]]})
+        self.compactions += 1
+        self.compacted_messages += cut
+        print(f"Compacted thread history: dropped {cut} of {len(messages)} messages")
+        return cut
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "threads": self._thread_count,
+            "max_threads": self.max_threads if self._conn is None else None,
+            "ttl_seconds": self.ttl,
+            "history_token_budget": self.history_token_budget,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "compactions": self.compactions,
+            "compacted_messages": self.compacted_messages,
+        }
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
@@ -1,8 +1,380 @@
+import asyncio
+import os
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
+DATABASE_PATH = os.getenv('BMO_DB_PATH', 'bmo_data.db')
+POOL_SIZE = int(os.getenv('BMO_DB_POOL_SIZE', '8'))
+# One worker per pooled connection so executor threads never queue on checkout
+DB_WORKERS = int(os.getenv('BMO_DB_WORKERS', str(POOL_SIZE)))
+
+# Applied to every connection handed out by the pool. WAL lets readers run
+# alongside a writer; NORMAL sync is safe under WAL and avoids an fsync per commit.
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,       # negative = KiB, ~16 MB page cache per connection
+    'mmap_size': 268435456,     # 256 MB memory-mapped I/O
+    'busy_timeout': 5000,
+}
+
+def configure_connection(conn, pragmas=None):
+    for name, value in (PRAGMAS if pragmas is None else pragmas).items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections.
+
+    Connections are opened lazily up to ``size``, configured once with ``pragmas``
+    and reused across requests. Use ``with pool.connection() as conn:`` to check one
+    out; it is rolled back if left mid-transaction and returned to the pool on exit.
+    """
+
+    def __init__(self, database=DATABASE_PATH, size=POOL_SIZE, pragmas=None,
+                 checkout_timeout=30.0, health_check_interval=30.0):
+        self.database = database
+        self.size = size
+        self.pragmas = PRAGMAS if pragmas is None else pragmas
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+        self._checkouts = 0
+        self._discarded = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return configure_connection(conn, self.pragmas)
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn, unhealthy=True):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._opened -= 1
+            if unhealthy:
+                self._discarded += 1
+
+    def _acquire(self):
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._opened < self.size
+                    if can_open:
+                        self._opened += 1
+                if can_open:
+                    try:
+                        return self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._opened -= 1
+                        raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No database connection available within {self.checkout_timeout}s")
+                try:
+                    conn, released_at = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+            # Only ping connections that have been sitting idle for a while
+            if time.monotonic() - released_at > self.health_check_interval and not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+            return conn
+
+    def _release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        if self._closed:
+            self._discard(conn, unhealthy=False)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        with self._lock:
+            self._checkouts += 1
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "discarded": self._discarded,
+            }
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn, unhealthy=False)
+
+db_pool = ConnectionPool()
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="bmo-db")
+
+async def run_db(func, *args, **kwargs):
+    """Run ``func(conn, *args, **kwargs)`` on the bounded DB executor with a pooled connection.
+
+    Keeps blocking sqlite3 calls off the event loop so slow queries do not stall
+    WebSockets or concurrent chat requests.
+    """
+    def call():
+        with db_pool.connection() as conn:
+            return func(conn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(db_executor, call)
+
+def shutdown_db():
+    db_executor.shutdown(wait=True)
+    db_pool.close()
+
+# Tables whose writes bump table_versions (sessions churn on every login, so they are excluded)
+DATA_TABLES = ("users", "banks", "reports", "validation_errors", "error_comments")
+
+# Per-bank report counters kept in report_stats; each expression is 1 when the row
+# counts towards the column. pending, accepted and rejected split reports by decision
+# (the is_accepted filter), so they add up to reports.
+REPORT_STAT_COLUMNS = {
+    "reports": "1",
+    "pending": "{row}.is_accepted IS NULL",
+    "accepted": "{row}.is_accepted IS 1",
+    "rejected": "{row}.is_accepted IS 0",
+    "with_errors": "{row}.has_errors IS 1",
+}
+
+def report_stat_deltas(row, sign):
+    return ", ".join(f"{column} = {column} {sign} ({expr.format(row=row)})"
+                     for column, expr in REPORT_STAT_COLUMNS.items())
+
+STATS_TABLES = [
+    f'''CREATE TABLE IF NOT EXISTS report_stats (
+        bank_id INTEGER PRIMARY KEY,
+        {", ".join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in REPORT_STAT_COLUMNS)},
+        errors INTEGER NOT NULL DEFAULT 0
+    )''',
+    '''CREATE TABLE IF NOT EXISTS error_type_stats (
+        error_type TEXT PRIMARY KEY,
+        errors INTEGER NOT NULL DEFAULT 0,
+        comments INTEGER NOT NULL DEFAULT 0
+    )''',
+]
+
+STATS_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS trg_banks_insert_stats AFTER INSERT ON banks
+        BEGIN
+            INSERT OR IGNORE INTO report_stats (bank_id) VALUES (NEW.id);
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_banks_delete_stats AFTER DELETE ON banks
+        BEGIN
+            DELETE FROM report_stats WHERE bank_id = OLD.id;
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_reports_insert_stats AFTER INSERT ON reports
+        BEGIN
+            INSERT OR IGNORE INTO report_stats (bank_id) VALUES (NEW.bank_id);
+            UPDATE report_stats SET {report_stat_deltas("NEW", "+")} WHERE bank_id = NEW.bank_id;
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_reports_delete_stats AFTER DELETE ON reports
+        BEGIN
+            UPDATE report_stats SET {report_stat_deltas("OLD", "-")} WHERE bank_id = OLD.bank_id;
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_reports_update_stats AFTER UPDATE OF bank_id, has_errors, is_accepted ON reports
+        BEGIN
+            UPDATE report_stats SET {report_stat_deltas("OLD", "-")} WHERE bank_id = OLD.bank_id;
+            INSERT OR IGNORE INTO report_stats (bank_id) VALUES (NEW.bank_id);
+            UPDATE report_stats SET {report_stat_deltas("NEW", "+")} WHERE bank_id = NEW.bank_id;
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_reports_move_stats AFTER UPDATE OF bank_id ON reports
+        WHEN OLD.bank_id IS NOT NEW.bank_id
+        BEGIN
+            UPDATE report_stats SET errors = errors - (SELECT COUNT(*) FROM validation_errors WHERE report_id = NEW.id)
+            WHERE bank_id = OLD.bank_id;
+            UPDATE report_stats SET errors = errors + (SELECT COUNT(*) FROM validation_errors WHERE report_id = NEW.id)
+            WHERE bank_id = NEW.bank_id;
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_validation_errors_insert_stats AFTER INSERT ON validation_errors
+        BEGIN
+            UPDATE report_stats SET errors = errors + 1
+            WHERE bank_id = (SELECT bank_id FROM reports WHERE id = NEW.report_id);
+            INSERT INTO error_type_stats (error_type, errors) VALUES (NEW.error_type, 1)
+            ON CONFLICT (error_type) DO UPDATE SET errors = errors + 1;
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_validation_errors_delete_stats AFTER DELETE ON validation_errors
+        BEGIN
+            UPDATE report_stats SET errors = errors - 1
+            WHERE bank_id = (SELECT bank_id FROM reports WHERE id = OLD.report_id);
+            UPDATE error_type_stats SET errors = errors - 1 WHERE error_type = OLD.error_type;
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_validation_errors_update_stats AFTER UPDATE OF report_id, error_type ON validation_errors
+        BEGIN
+            UPDATE report_stats SET errors = errors - 1
+            WHERE bank_id = (SELECT bank_id FROM reports WHERE id = OLD.report_id);
+            UPDATE report_stats SET errors = errors + 1
+            WHERE bank_id = (SELECT bank_id FROM reports WHERE id = NEW.report_id);
+            UPDATE error_type_stats
+            SET errors = errors - 1, comments = comments - (SELECT COUNT(*) FROM error_comments WHERE error_id = NEW.id)
+            WHERE error_type = OLD.error_type;
+            INSERT INTO error_type_stats (error_type, errors, comments)
+            VALUES (NEW.error_type, 1, (SELECT COUNT(*) FROM error_comments WHERE error_id = NEW.id))
+            ON CONFLICT (error_type) DO UPDATE SET errors = errors + 1, comments = comments + excluded.comments;
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_error_comments_insert_stats AFTER INSERT ON error_comments
+        BEGIN
+            UPDATE error_type_stats SET comments = comments + 1
+            WHERE error_type = (SELECT error_type FROM validation_errors WHERE id = NEW.error_id);
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_error_comments_delete_stats AFTER DELETE ON error_comments
+        BEGIN
+            UPDATE error_type_stats SET comments = comments - 1
+            WHERE error_type = (SELECT error_type FROM validation_errors WHERE id = OLD.error_id);
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_error_comments_update_stats AFTER UPDATE OF error_id ON error_comments
+        BEGIN
+            UPDATE error_type_stats SET comments = comments - 1
+            WHERE error_type = (SELECT error_type FROM validation_errors WHERE id = OLD.error_id);
+            UPDATE error_type_stats SET comments = comments + 1
+            WHERE error_type = (SELECT error_type FROM validation_errors WHERE id = NEW.error_id);
+        END''',
+]
+
+# Rebuild the summary tables from the data tables (run once when the migration is applied)
+STATS_BACKFILL = [
+    "DELETE FROM report_stats",
+    "DELETE FROM error_type_stats",
+    "INSERT INTO report_stats (bank_id) SELECT id FROM banks",
+    f'''INSERT INTO report_stats (bank_id, {", ".join(REPORT_STAT_COLUMNS)})
+        SELECT r.bank_id, {", ".join(f"SUM({expr.format(row='r')})" for expr in REPORT_STAT_COLUMNS.values())}
+        FROM reports r WHERE true GROUP BY r.bank_id
+        ON CONFLICT (bank_id) DO UPDATE SET {", ".join(f"{column} = excluded.{column}" for column in REPORT_STAT_COLUMNS)}''',
+    '''UPDATE report_stats SET errors = (
+        SELECT COUNT(*) FROM validation_errors ve JOIN reports r ON r.id = ve.report_id
+        WHERE r.bank_id = report_stats.bank_id
+    )''',
+    '''INSERT INTO error_type_stats (error_type, errors, comments)
+        SELECT ve.error_type, COUNT(DISTINCT ve.id), COUNT(ec.id)
+        FROM validation_errors ve LEFT JOIN error_comments ec ON ec.error_id = ve.id
+        GROUP BY ve.error_type''',
+]
+
+# Ordered schema migrations applied by init_database() after the base tables exist.
+# Each entry is (version, description, statements); append new steps, never edit old ones.
+MIGRATIONS = [
+    (1, "Indexes for report listing, bank lookups, error and comment joins", [
+        # Keyset pagination on (submission_date, id) and the report status filters
+        "CREATE INDEX IF NOT EXISTS idx_reports_submission ON reports (submission_date DESC, id DESC, bank_id, has_errors, is_accepted)",
+        # delete_bank report count and per-bank report listing
+        "CREATE INDEX IF NOT EXISTS idx_reports_bank ON reports (bank_id, submission_date DESC, id DESC)",
+        # /api/banks ordering, answered from the index alone
+        "CREATE INDEX IF NOT EXISTS idx_banks_name ON banks (name, aba_code)",
+        "CREATE INDEX IF NOT EXISTS idx_validation_errors_report ON validation_errors (report_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_error_comments_error ON error_comments (error_id, id, user_id)",
+    ]),
+    (2, "Per-table write counters maintained by triggers", [
+        '''CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )''',
+        *[f"INSERT OR IGNORE INTO table_versions (table_name) VALUES ('{table}')" for table in DATA_TABLES],
+        *[f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version AFTER {event} ON {table}
+            BEGIN
+                UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+            END''' for table in DATA_TABLES for event in ("INSERT", "UPDATE", "DELETE")],
+    ]),
+    (3, "Dashboard summary tables maintained by triggers", [
+        *STATS_TABLES,
+        *STATS_TRIGGERS,
+        *STATS_BACKFILL,
+    ]),
+    (4, "Session owner, role, expiry and last-seen time", [
+        "ALTER TABLE sessions ADD COLUMN user_id INTEGER REFERENCES users (id)",
+        "ALTER TABLE sessions ADD COLUMN role TEXT",
+        "ALTER TABLE sessions ADD COLUMN expires_at REAL",
+        "ALTER TABLE sessions ADD COLUMN last_seen REAL",
+        # Older sessions did not record their user and cannot be restored
+        "DELETE FROM sessions WHERE user_id IS NULL",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)",
+    ]),
+]
+
+def get_table_versions(conn, tables=None):
+    """Return {table: write counter}; counters only ever increase."""
+    rows = conn.execute("SELECT table_name, version FROM table_versions").fetchall()
+    versions = {row[0]: row[1] for row in rows}
+    return versions if tables is None else {table: versions.get(table, 0) for table in tables}
+
+def get_data_version(conn):
+    """Single number that changes whenever any data table is written, from any connection or process."""
+    return conn.execute("SELECT COALESCE(SUM(version), 0) FROM table_versions").fetchone()[0]
+
+def get_schema_version(conn):
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def apply_migrations(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for version, description, statements in MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+        # IMMEDIATE takes the write lock up front so concurrent workers apply each step once
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= get_schema_version(conn):
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Applied schema migration {version}: {description}")
+
 def init_database():
-    conn = sqlite3.connect('bmo_data.db')
+    conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
     
     # Users table
@@ -71,10 +443,12 @@ def init_database():
     ''')
     
     conn.commit()
+    apply_migrations(conn)
     conn.close()
     print("Database initialized successfully")
 
 def get_db_connection():
-    conn = sqlite3.connect('bmo_data.db')
+    """Open a standalone connection (scripts such as seed_data.py); request handlers use ``db_pool``."""
+    conn = sqlite3.connect(DATABASE_PATH)
     conn.row_factory = sqlite3.Row
-    return conn
\ No newline at end of file
+    return configure_connection(conn)
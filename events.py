@@ -0,0 +1,128 @@
+"""In-process pub/sub for pushing events to connected WebSockets.
+
+Every socket gets a bounded queue drained by its own sender task, so publishing never
+waits on a client. A socket whose queue overflows, or whose send does not complete
+within ``send_timeout``, is evicted and closed; the client reconnects and reloads.
+Each socket numbers its own events with ``seq`` (1, 2, 3, ...), so a gap means that
+socket missed an event.
+
+With a ``backend`` (see ``state_backend``) every event is also relayed to the other
+worker processes, which deliver it to their own sockets. Event types registered with
+``on`` are control messages: they run their handler on every worker and are never sent
+to clients.
+"""
+import asyncio
+import itertools
+import os
+
+EVENT_QUEUE_SIZE = int(os.getenv('BMO_EVENT_QUEUE_SIZE', '256'))
+EVENT_SEND_TIMEOUT = float(os.getenv('BMO_EVENT_SEND_TIMEOUT', '5'))
+# WebSocket close code 1013 "Try Again Later"
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+class Subscriber:
+    def __init__(self, websocket, token, queue_size):
+        self.websocket = websocket
+        self.token = token
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.seq = itertools.count(1)
+        self.task = None
+
+class EventBus:
+    def __init__(self, queue_size=EVENT_QUEUE_SIZE, send_timeout=EVENT_SEND_TIMEOUT, backend=None):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.backend = backend
+        self._handlers = {}  # {event type: async handler(event, token)}
+        self._subscribers = set()
+        self.published = 0
+        self.delivered = 0
+        self.evicted = 0
+
+    async def start(self):
+        if self.backend is not None:
+            await self.backend.start(self._deliver)
+
+    async def stop(self):
+        if self.backend is not None:
+            await self.backend.stop()
+
+    def on(self, event_type, handler):
+        self._handlers[event_type] = handler
+
+    def subscribe(self, websocket, token):
+        subscriber = Subscriber(websocket, token, self.queue_size)
+        subscriber.task = asyncio.create_task(self._drain(subscriber))
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.discard(subscriber)
+            subscriber.task.cancel()
+
+    def connections(self, token):
+        return sum(1 for subscriber in self._subscribers if subscriber.token == token)
+
+    def publish(self, event, token=None):
+        """Queue ``event`` for every socket, or only the sockets of session ``token``, on all workers."""
+        self.published += 1
+        if self.backend is not None:
+            self.backend.publish(event, token)
+        self._deliver(event, token)
+
+    def _deliver(self, event, token):
+        handler = self._handlers.get(event.get("type"))
+        if handler is not None:
+            asyncio.create_task(handler(event, token))
+            return
+        for subscriber in list(self._subscribers):
+            if token is not None and subscriber.token != token:
+                continue
+            try:
+                subscriber.queue.put_nowait({**event, "seq": next(subscriber.seq)})
+            except asyncio.QueueFull:
+                self._evict(subscriber, "queue full")
+
+    async def disconnect(self, token):
+        """Close every socket of a session (e.g. on logout)."""
+        for subscriber in [s for s in self._subscribers if s.token == token]:
+            self.unsubscribe(subscriber)
+            await self._close(subscriber.websocket, 1000)
+
+    async def _drain(self, subscriber):
+        try:
+            while True:
+                event = await subscriber.queue.get()
+                await asyncio.wait_for(subscriber.websocket.send_json(event), self.send_timeout)
+                self.delivered += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._evict(subscriber, f"send failed: {e or type(e).__name__}")
+
+    def _evict(self, subscriber, reason):
+        if subscriber not in self._subscribers:
+            return
+        print(f"Evicting WebSocket subscriber ({reason})")
+        self.evicted += 1
+        self.unsubscribe(subscriber)
+        asyncio.create_task(self._close(subscriber.websocket, SLOW_CONSUMER_CLOSE_CODE))
+
+    async def _close(self, websocket, code):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def stats(self):
+        depths = [subscriber.queue.qsize() for subscriber in self._subscribers]
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "evicted": self.evicted,
+            "max_queue_depth": max(depths, default=0),
+            "queue_size": self.queue_size,
+            "shared": self.backend.stats() if self.backend is not None else None,
+        }
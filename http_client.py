@@ -0,0 +1,221 @@
+"""Pooled HTTP clients shared by the MCP servers that call the BMO REST API.
+
+``ApiClient`` (requests) serves synchronous callers and ``AsyncApiClient`` (httpx)
+serves async MCP tools. Both keep TCP connections alive between tool calls, apply
+connect/read timeouts, retry idempotent methods with exponential backoff and record
+per-endpoint latency. ``AsyncApiClient`` also revalidates GET responses that carried an
+ETag, so an unchanged list costs a 304 instead of a full body.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv('BMO_HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('BMO_HTTP_TIMEOUT', '30'))
+HTTP_RETRIES = int(os.getenv('BMO_HTTP_RETRIES', '3'))
+HTTP_BACKOFF = float(os.getenv('BMO_HTTP_BACKOFF', '0.3'))
+HTTP_POOL_SIZE = int(os.getenv('BMO_HTTP_POOL_SIZE', '20'))
+# GET responses kept for If-None-Match revalidation; 0 disables
+HTTP_ETAG_CACHE_SIZE = int(os.getenv('BMO_HTTP_ETAG_CACHE', '128'))
+
+# POST is not idempotent (e.g. adding a comment), so it is never retried
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = (429, 502, 503, 504)
+
+class LatencyMetrics:
+    """Per-endpoint call counts, errors and latency percentiles over a sliding window."""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, elapsed_ms, ok):
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {
+                "calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "samples": deque(maxlen=self.window),
+            })
+            entry["calls"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["samples"].append(elapsed_ms)
+            if not ok:
+                entry["errors"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for endpoint, entry in self._endpoints.items():
+                samples = sorted(entry["samples"])
+                result[endpoint] = {
+                    "calls": entry["calls"],
+                    "errors": entry["errors"],
+                    "avg_ms": round(entry["total_ms"] / entry["calls"], 2),
+                    "p50_ms": round(samples[len(samples) // 2], 2),
+                    "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+                    "max_ms": round(entry["max_ms"], 2),
+                }
+            return result
+
+class ETagCache:
+    """Least recently used GET bodies keyed by URL, replayed when the server answers 304.
+
+    Entries are shared across session tokens: the API checks authorization before it
+    answers 304, and the cached lists do not depend on the caller.
+    """
+
+    def __init__(self, max_entries=HTTP_ETAG_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # {url: (etag, content_type, content)}
+        self.not_modified = 0
+        self.modified = 0
+
+    def lookup(self, key):
+        """The cached ``(etag, content_type, content)`` for ``key``, or ``None``.
+
+        Callers keep the entry they revalidate: it may be evicted before the 304 arrives.
+        """
+        return self._entries.get(key)
+
+    def update(self, key, response, entry):
+        """Return the response to hand to the caller: ``entry``'s body on 304, else ``response``."""
+        if response.status_code == 304 and entry is not None:
+            self.not_modified += 1
+            # Still valid, so keep it even if it was evicted while the request was in flight
+            self._store(key, entry)
+            etag, content_type, content = entry
+            # Decoded body, so no Content-Encoding header
+            return httpx.Response(200, headers={"ETag": etag, "Content-Type": content_type},
+                                  content=content, request=response.request)
+        etag = response.headers.get("etag")
+        if response.status_code == 200 and etag:
+            if entry is not None:
+                self.modified += 1
+            self._store(key, (etag, response.headers.get("content-type", ""), response.content))
+        return response
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "not_modified": self.not_modified,
+            "modified": self.modified,
+            "cached_bytes": sum(len(entry[2]) for entry in self._entries.values()),
+        }
+
+class ApiClient:
+    """Keep-alive HTTP client bound to one base URL."""
+
+    def __init__(self, base_url, connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 retries=HTTP_RETRIES, backoff=HTTP_BACKOFF, pool_size=HTTP_POOL_SIZE, verify=True):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.metrics = LatencyMetrics()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.verify = verify
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, endpoint=None, **kwargs):
+        """Send a request to ``base_url + path``.
+
+        ``endpoint`` is the metrics label, normally the route template such as
+        ``GET /api/reports/{report_id}/errors``; it defaults to method and path.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        label = endpoint or f"{method.upper()} {path}"
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(method.upper(), f"{self.base_url}{path}", **kwargs)
+            ok = response.status_code < 500
+            return response
+        finally:
+            self.metrics.record(label, (time.perf_counter() - started) * 1000, ok)
+
+    def close(self):
+        self.session.close()
+
+class AsyncApiClient:
+    """Async keep-alive HTTP client bound to one base URL.
+
+    The underlying ``httpx.AsyncClient`` is created on first use so it belongs to the
+    event loop that runs the MCP server. ``max_connections`` bounds concurrent requests
+    to the API; extra calls wait for a free connection.
+    """
+
+    def __init__(self, base_url, connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 retries=HTTP_RETRIES, backoff=HTTP_BACKOFF, max_connections=HTTP_POOL_SIZE, verify=True,
+                 etag_cache_size=HTTP_ETAG_CACHE_SIZE):
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.retries = retries
+        self.backoff = backoff
+        self.verify = verify
+        self.metrics = LatencyMetrics()
+        self.etags = ETagCache(etag_cache_size) if etag_cache_size > 0 else None
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout,
+                                             limits=self.limits, verify=self.verify)
+        return self._client
+
+    async def request(self, method, path, endpoint=None, **kwargs):
+        """Send a request to ``base_url + path``; see ``ApiClient.request`` for ``endpoint``."""
+        method = method.upper()
+        label = endpoint or f"{method} {path}"
+        attempts = self.retries + 1 if method in IDEMPOTENT_METHODS else 1
+        client = self._get_client()
+        cache_key = cached = None
+        if method == "GET" and self.etags is not None:
+            cache_key = str(httpx.URL(path, params=kwargs.get("params")))
+            cached = self.etags.lookup(cache_key)
+            if cached:
+                kwargs["headers"] = {**(kwargs.get("headers") or {}), "If-None-Match": cached[0]}
+        started = time.perf_counter()
+        ok = False
+        try:
+            for attempt in range(attempts):
+                last_attempt = attempt == attempts - 1
+                try:
+                    response = await client.request(method, path, **kwargs)
+                except httpx.TransportError:
+                    if last_attempt:
+                        raise
+                else:
+                    if response.status_code not in RETRY_STATUSES or last_attempt:
+                        ok = response.status_code < 500
+                        return self.etags.update(cache_key, response, cached) if cache_key else response
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+        finally:
+            self.metrics.record(label, (time.perf_counter() - started) * 1000, ok)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
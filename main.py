@@ -1,34 +1,25 @@
-from fastapi import FastAPI, WebSocket, HTTPException, Depends, Header
+from fastapi import FastAPI, WebSocket, HTTPException, Depends, Header, Query, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+import asyncio
 import json
-import random
-from database import init_database, get_db_connection
-from models import LoginRequest, CommentRequest, StatusUpdateRequest
+import os
+import time
+from typing import Optional
+import repository
+from database import init_database, run_db, shutdown_db, db_pool, get_data_version
+from admission import AdmissionController, AdmissionRejected
+from answer_cache import AnswerCache
+from conditional import conditional_get
+from events import EventBus
+from sessions import SessionRecord, SessionStore
+from state_backend import create_backend
+from models import (LoginRequest, CommentRequest, StatusUpdateRequest, BatchReportErrorsRequest,
+                    BatchStatusUpdateRequest, BatchCommentRequest)
 from mcp_agent import MCPAgent
 
-def load_sessions():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    tokens = cursor.execute("SELECT token FROM sessions").fetchall()
-    conn.close()
-    return set(row['token'] for row in tokens)
-
-def save_session(token):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR IGNORE INTO sessions (token) VALUES (?)", (token,))
-    conn.commit()
-    conn.close()
-
-def remove_session(token):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM sessions WHERE token = ?", (token,))
-    conn.commit()
-    conn.close()
-
 # Initialize FastAPI application
 app = FastAPI()
 
@@ -39,26 +30,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# Compress JSON bodies above this size; brotli when brotli-asgi is installed and the client accepts it
+COMPRESS_MIN_SIZE = int(os.getenv('BMO_COMPRESS_MIN_SIZE', '1000'))
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_SIZE, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE)
+
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
     init_database()
     
     # Load existing sessions after database is ready
-    global active_sessions
-    active_sessions = load_sessions()
-    await initialize_agent()
+    await sessions.start()
+    await events.start()
+    # The agent connects to the MCP servers in the background so the REST API is up immediately
+    global agent_init_task
+    agent_init_task = asyncio.create_task(initialize_agent())
 
     print("BMO Application started successfully")
  
 # Create a single instance of MCPAgent
 agent = MCPAgent()
+# Bounds concurrent agent turns, globally and per user
+admission = AdmissionController()
+# Repeated questions are answered without running the agent until the data changes
+answer_cache = AnswerCache()
+# Pushes change deltas and chat progress to connected WebSockets, relayed between workers
+events = EventBus(backend=create_backend())
+# Login sessions, authenticated from memory and persisted in the sessions table
+sessions = SessionStore()
+
+async def revoke_session(event, token):
+    """A logout on any worker: forget the session here and close its sockets."""
+    sessions.forget(token)
+    await events.disconnect(token)
+
+events.on("session_revoked", revoke_session)
+
+agent_init_task = None
 
 # Background task to initialize the agent
 async def initialize_agent():
-    await agent.initialize()
+    try:
+        await agent.initialize()
+    except Exception as e:
+        print(f"Agent initialization failed: {e}")
 
 # # Startup event to initialize the agent
 # @app.on_event("startup")
@@ -68,262 +90,263 @@ async def initialize_agent():
 @app.on_event("shutdown")
 async def shutdown_event():
     await agent.cleanup()
+    await sessions.stop()
+    await events.stop()
+    shutdown_db()
 
 
 
-# User session data
-user_sessions = {}  # {token: {"user_id": int, "username": str, "websockets": list}}
-active_sessions = set()
-
-def check_auth(authorization: str = Header(None)):
+async def check_auth(authorization: str = Header(None)) -> SessionRecord:
     token = authorization.replace("Bearer ", "") if authorization else None
-    if not token or token not in active_sessions:
+    session = await sessions.get(token)
+    if session is None:
         # Just for testing, allow a default token
         # token = "123456"
         raise HTTPException(status_code=401, detail="Not authenticated")
-    return token
+    return session
 
 @app.post("/api/login")
 async def login(credentials: dict):
     print(f"Login attempt for username: {credentials.get('username')}")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    user = cursor.execute(
-        "SELECT id, username, password, role FROM users WHERE username = ?", 
-        (credentials.get('username'),)
-    ).fetchone()
+    user = await run_db(repository.find_user, credentials.get('username'))
     
     if user and user['password'] == credentials.get('password'):
-        session_token = str(random.randint(100000000, 999999999))
-        active_sessions.add(session_token)
-        user_sessions[session_token] = {
-            "user_id": user['id'],
-            "username": user['username'],
-            "role": user['role'],
-            "websockets": []
-        }
-        save_session(session_token)
-        conn.close()
+        session = await sessions.create(user)
         print(f"Login successful for user: {user['username']}")
-        return {"token": session_token, "success": True, "user": {"username": user['username'], "role": user['role']}}
+        return {"token": session.token, "success": True, "user": {"username": user['username'], "role": user['role']}}
     
-    conn.close()
     print("Login failed: Invalid credentials")
     raise HTTPException(status_code=401, detail="Invalid credentials")
 
 @app.post("/api/logout")
 async def logout(authorization: str = Header(None)):
     token = authorization.replace("Bearer ", "") if authorization else None
-    if token and token in active_sessions:
-        active_sessions.remove(token)
-        if token in user_sessions:
-            del user_sessions[token]
-        remove_session(token)
+    if await sessions.get(token):
+        await sessions.remove(token)
+        await agent.forget(token)
+        events.publish({"type": "session_revoked"}, token=token)
     print("User logged out successfully")
     return {"success": True}
 
 @app.get("/api/banks")
-async def get_banks(token: str = Depends(check_auth)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    banks = cursor.execute("""
-        SELECT id, aba_code, name
-        FROM banks
-        ORDER BY name
-    """).fetchall()
-    
-    result = [dict(bank) for bank in banks]
-    conn.close()
-    return result
+async def get_banks(request: Request, session: SessionRecord = Depends(check_auth)):
+    return await conditional_get(request, ("banks",), lambda: run_db(repository.list_banks))
+
+@app.get("/api/stats")
+async def get_stats(session: SessionRecord = Depends(check_auth)):
+    return await run_db(repository.get_report_statistics)
+
+def report_filters(
+    limit: int = Query(repository.REPORT_PAGE_SIZE, ge=1, le=repository.MAX_REPORT_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    bank_id: Optional[int] = None,
+    aba_code: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    has_errors: Optional[bool] = None,
+    is_accepted: Optional[bool] = None,
+    search: Optional[str] = None,
+):
+    return {
+        "limit": limit, "cursor": cursor, "bank_id": bank_id, "aba_code": aba_code,
+        "date_from": date_from, "date_to": date_to, "has_errors": has_errors,
+        "is_accepted": is_accepted, "search": search,
+    }
+
+async def fetch_report_page(filters, status=None):
+    if status is not None and status not in repository.STATUS_FILTERS:
+        raise HTTPException(status_code=400, detail="Invalid status. Use: accepted, rejected, or pending")
+    try:
+        return await run_db(repository.list_reports, status=status, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Tables read by repository.list_reports
+REPORT_LIST_TABLES = ("reports", "banks")
 
 @app.get("/api/reports")
-async def get_reports(token: str = Depends(check_auth)):
+async def get_reports(request: Request, status: Optional[str] = None, filters: dict = Depends(report_filters), session: SessionRecord = Depends(check_auth)):
     print("Fetching reports list")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    reports = cursor.execute("""
-        SELECT r.id, r.report_code, r.submission_date, r.has_errors, r.is_accepted,
-               b.aba_code, b.name as bank_name
-        FROM reports r
-        JOIN banks b ON r.bank_id = b.id
-        ORDER BY r.submission_date DESC
-    """).fetchall()
-    
-    result = [dict(report) for report in reports]
-    conn.close()
-    print(f"Retrieved {len(result)} reports")
-    return result
+    return await conditional_get(request, REPORT_LIST_TABLES, lambda: fetch_report_page(filters, status))
 
 @app.get("/api/reports/status/{status}")
-async def get_reports_by_status(status: str, token: str = Depends(check_auth)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if status == "accepted":
-        where_clause = "r.is_accepted = 1"
-    elif status == "rejected":
-        where_clause = "r.is_accepted = 0 AND r.has_errors = 1"
-    elif status == "pending":
-        where_clause = "r.is_accepted IS NULL"
-    else:
-        raise HTTPException(status_code=400, detail="Invalid status. Use: accepted, rejected, or pending")
-    
-    reports = cursor.execute(f"""
-        SELECT r.id, r.report_code, r.submission_date, r.has_errors, r.is_accepted,
-               b.aba_code, b.name as bank_name
-        FROM reports r
-        JOIN banks b ON r.bank_id = b.id
-        WHERE {where_clause}
-        ORDER BY r.submission_date DESC
-    """).fetchall()
-    
-    result = [dict(report) for report in reports]
-    conn.close()
-    return result
+async def get_reports_by_status(request: Request, status: str, filters: dict = Depends(report_filters), session: SessionRecord = Depends(check_auth)):
+    return await conditional_get(request, REPORT_LIST_TABLES, lambda: fetch_report_page(filters, status))
 
 @app.get("/api/reports/{report_id}/errors")
-async def get_report_errors(report_id: int, token: str = Depends(check_auth)):
+async def get_report_errors(report_id: int,
+                            comment_limit: int = Query(repository.ERROR_COMMENT_LIMIT, ge=0, le=repository.MAX_COMMENT_PAGE_SIZE),
+                            session: SessionRecord = Depends(check_auth)):
     print(f"Fetching errors for report {report_id}")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    errors = cursor.execute("""
-        SELECT ve.id, ve.error_type, ve.error_message, ve.field_name,
-               GROUP_CONCAT(u.username || ': ' || ec.comment || ' (' || ec.created_at || ')', '\n') as comments
-        FROM validation_errors ve
-        LEFT JOIN error_comments ec ON ve.id = ec.error_id
-        LEFT JOIN users u ON ec.user_id = u.id
-        WHERE ve.report_id = ?
-        GROUP BY ve.id
-        ORDER BY ve.id
-    """, (report_id,)).fetchall()
-    
-    result = []
-    for error in errors:
-        error_dict = dict(error)
-        error_dict['comments'] = error_dict['comments'].split('\n') if error_dict['comments'] else []
-        result.append(error_dict)
-    
-    conn.close()
+    result = await run_db(repository.get_report_errors, report_id, comment_limit)
     print(f"Retrieved {len(result)} errors for report {report_id}")
     return result
 
+@app.get("/api/errors/{error_id}/comments")
+async def list_error_comments(error_id: int,
+                              limit: int = Query(repository.COMMENT_PAGE_SIZE, ge=1, le=repository.MAX_COMMENT_PAGE_SIZE),
+                              cursor: Optional[str] = None, session: SessionRecord = Depends(check_auth)):
+    try:
+        return await run_db(repository.list_error_comments, error_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/api/errors/{error_id}/comments")
-async def add_error_comment(error_id: int, comment_data: CommentRequest, token: str = Depends(check_auth)):
+async def add_error_comment(error_id: int, comment_data: CommentRequest, session: SessionRecord = Depends(check_auth)):
     print(f"Adding comment to error {error_id}")
-    
-    if token not in user_sessions:
-        raise HTTPException(status_code=401, detail="Invalid session")
-    
-    user_id = user_sessions[token]['user_id']
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "INSERT INTO error_comments (error_id, user_id, comment) VALUES (?, ?, ?)",
-        (error_id, user_id, comment_data.comment)
-    )
-    
-    conn.commit()
-    conn.close()
+    comment = await run_db(repository.add_error_comment, error_id, session.user_id, comment_data.comment)
+    events.publish({"type": "comments_added", "comments": [comment]})
     print(f"Comment added successfully to error {error_id}")
     return {"success": True}
  
 @app.put("/api/reports/{report_id}/status")
-async def update_report_status(report_id: int, status_data: StatusUpdateRequest, token: str = Depends(check_auth)):
+async def update_report_status(report_id: int, status_data: StatusUpdateRequest, session: SessionRecord = Depends(check_auth)):
     print(f"Updating report {report_id} status to {'accepted' if status_data.is_accepted else 'rejected'}")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Check if trying to accept a report with errors
-    if status_data.is_accepted:
-        report = cursor.execute(
-            "SELECT has_errors FROM reports WHERE id = ?", 
-            (report_id,)
-        ).fetchone()
-        
-        if report and report['has_errors']:
-            conn.close()
-            raise HTTPException(
-                status_code=400, 
-                detail="Cannot accept report that contains validation errors"
-            )
-    
-    cursor.execute(
-        "UPDATE reports SET is_accepted = ? WHERE id = ?",
-        (status_data.is_accepted, report_id)
-    )
-    
-    conn.commit()
-    conn.close()
+    try:
+        await run_db(repository.update_report_status, report_id, status_data.is_accepted)
+    except repository.ConflictError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    events.publish({"type": "reports_updated", "reports": [{"id": report_id, "is_accepted": status_data.is_accepted}]})
     print(f"Report {report_id} status updated successfully")
     return {"success": True}
 
+def check_batch_size(items):
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(items) > repository.MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch too large. Maximum is {repository.MAX_BATCH_SIZE} items.")
+
+@app.post("/api/reports/errors:batch")
+async def get_errors_for_reports(batch: BatchReportErrorsRequest, session: SessionRecord = Depends(check_auth)):
+    check_batch_size(batch.report_ids)
+    print(f"Fetching errors for {len(batch.report_ids)} reports")
+    errors = await run_db(repository.get_errors_for_reports, batch.report_ids)
+    return {"reports": [{"report_id": report_id, "errors": report_errors} for report_id, report_errors in errors.items()]}
+
+@app.put("/api/reports/status:batch")
+async def update_report_statuses(batch: BatchStatusUpdateRequest, session: SessionRecord = Depends(check_auth)):
+    check_batch_size(batch.updates)
+    print(f"Updating status of {len(batch.updates)} reports")
+    decisions = {update.report_id: update.is_accepted for update in batch.updates}
+    result = await run_db(repository.update_report_statuses,
+                          [(update.report_id, update.is_accepted) for update in batch.updates])
+    if result["updated"]:
+        events.publish({"type": "reports_updated", "reports": [
+            {"id": report_id, "is_accepted": decisions[report_id]} for report_id in result["updated"]
+        ]})
+    print(f"Updated {len(result['updated'])} reports, {len(result['failed'])} failed")
+    return {"success": not result["failed"], **result}
+
+@app.post("/api/errors/comments:batch")
+async def add_error_comments(batch: BatchCommentRequest, session: SessionRecord = Depends(check_auth)):
+    check_batch_size(batch.comments)
+    result = await run_db(repository.add_error_comments, session.user_id,
+                          [(item.error_id, item.comment) for item in batch.comments])
+    comments = result.pop("comments")
+    if comments:
+        events.publish({"type": "comments_added", "comments": comments})
+    print(f"Added {result['added']} comments, {len(result['failed'])} failed")
+    return {"success": not result["failed"], **result}
+
 @app.post("/api/banks")
-async def create_bank(bank_data: dict, token: str = Depends(check_auth)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "INSERT INTO banks (aba_code, name) VALUES (?, ?)",
-        (bank_data['aba_code'], bank_data['name'])
-    )
-    
-    conn.commit()
-    conn.close()
-    return {"success": True}
+async def create_bank(bank_data: dict, session: SessionRecord = Depends(check_auth)):
+    bank_id = await run_db(repository.create_bank, bank_data['aba_code'], bank_data['name'])
+    events.publish({"type": "bank_created", "bank": {"id": bank_id, "aba_code": bank_data['aba_code'], "name": bank_data['name']}})
+    return {"success": True, "id": bank_id}
 
 @app.put("/api/banks/{bank_id}")
-async def update_bank(bank_id: int, bank_data: dict, token: str = Depends(check_auth)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "UPDATE banks SET aba_code = ?, name = ? WHERE id = ?",
-        (bank_data['aba_code'], bank_data['name'], bank_id)
-    )
-    
-    conn.commit()
-    conn.close()
+async def update_bank(bank_id: int, bank_data: dict, session: SessionRecord = Depends(check_auth)):
+    await run_db(repository.update_bank, bank_id, bank_data['aba_code'], bank_data['name'])
+    events.publish({"type": "bank_updated", "bank": {"id": bank_id, "aba_code": bank_data['aba_code'], "name": bank_data['name']}})
     return {"success": True}
 
 @app.delete("/api/banks/{bank_id}")
-async def delete_bank(bank_id: int, token: str = Depends(check_auth)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Check if bank has any reports
-    report_count = cursor.execute(
-        "SELECT COUNT(*) as count FROM reports WHERE bank_id = ?", 
-        (bank_id,)
-    ).fetchone()['count']
-    
-    if report_count > 0:
-        conn.close()
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Cannot delete bank. It has {report_count} associated report(s)."
-        )
-    
-    cursor.execute("DELETE FROM banks WHERE id = ?", (bank_id,))
-    
-    conn.commit()
-    conn.close()
+async def delete_bank(bank_id: int, session: SessionRecord = Depends(check_auth)):
+    try:
+        await run_db(repository.delete_bank, bank_id)
+    except repository.ConflictError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    events.publish({"type": "bank_deleted", "bank_id": bank_id})
     return {"success": True}
 
 @app.post("/api/chat")
-async def chat(message_data: dict, token: str = Depends(check_auth)):
+async def chat(message_data: dict, session: SessionRecord = Depends(check_auth)):
     message = message_data.get('message', '')
     print(f"Received chat message: {message}")
+    if not agent.ready:
+        raise HTTPException(status_code=503, detail="The assistant is starting up, please retry shortly",
+                            headers={"Retry-After": "5"})
+    token, user = session.token, session.user_id
+    # Clients can opt out per request, e.g. for a user who always wants a fresh answer
+    use_cache = message_data.get('cache', True)
+    data_version = await run_db(get_data_version) if use_cache else None
+    if use_cache:
+        cached = answer_cache.lookup(message, user, data_version)
+        if cached:
+            return await answer_from_cache(message, message_data, token, *cached)
+    try:
+        async with admission.slot(user):
+            result = await answer_chat(message, message_data, token)
+    except AdmissionRejected as e:
+        print(f"Chat request rejected: {e}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    # A turn that wrote data (or raced with a write) is not reusable
+    if use_cache and await run_db(get_data_version) == data_version:
+        answer_cache.store(message, user, data_version, result)
+    return result
+
+async def answer_from_cache(message, message_data, token, entry, similarity):
+    print(f"Answer cache hit ({similarity:.2f}) for: {entry['question']}")
+    result = entry["result"]
+    await agent.record_turn(message, token, result["answer"])
+    response = {
+        "answer": result["answer"],
+        "tool_calls": [],
+        "usage": dict.fromkeys(result["usage"], 0),
+        "cached": {
+            "question": entry["question"],
+            "similarity": round(similarity, 4),
+            "age_seconds": round(time.time() - entry["created"], 1),
+        },
+    }
+    if message_data.get('stream'):
+        chat_id = message_data.get('chat_id')
+        events.publish({"type": "chat_done", "answer": result["answer"], "chat_id": chat_id}, token=token)
+        response["chat_id"] = chat_id
+    return response
+
+async def answer_chat(message, message_data, token):
     # response = f"Echo: {message}"
-    response = await agent.question(message, token)
-    return {"response": response}
+    verbose = bool(message_data.get('verbose'))
+    if message_data.get('stream'):
+        # Tokens and tool progress go over /ws tagged with chat_id; the HTTP reply carries only the answer
+        chat_id = message_data.get('chat_id')
+
+        async def forward(event):
+            events.publish({**event, "chat_id": chat_id}, token=token)
+
+        result = await agent.stream_question(message, token, forward, verbose)
+        await forward({"type": "chat_done", "answer": result["answer"]})
+        return {**result, "chat_id": chat_id}
+    return await agent.question(message, token, verbose)
+
+@app.get("/api/health")
+async def health():
+    return {"status": "ok", "agent": agent.status()}
+
+@app.get("/api/metrics")
+async def get_metrics(session: SessionRecord = Depends(check_auth)):
+    return {
+        "chat_admission": admission.stats(),
+        "conversations": agent.conversations.stats(),
+        "prompt_window": agent.prompt_window.stats(),
+        "answer_cache": answer_cache.stats(),
+        "events": events.stats(),
+        "sessions": sessions.stats(),
+        "db_pool": db_pool.stats(),
+    }
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -341,27 +364,24 @@ async def websocket_endpoint(websocket: WebSocket):
         await websocket.close()
         return
     
-    if not token or token not in active_sessions:
-        print(f"Invalid token or session: {token}")
-        await websocket.close()
-        return
-    
-    if token not in user_sessions:
-        print(f"Token not in user_sessions: {token}")
+    session = await sessions.get(token)
+    if not session:
+        print("Invalid token or session")
         await websocket.close()
         return
     
-    user_sessions[token]["websockets"].append(websocket)
-    print(f"WebSocket connected for user {user_sessions[token]['username']}. Total connections: {len(user_sessions[token]['websockets'])}")
+    subscriber = events.subscribe(websocket, token)
+    username = session.username
+    print(f"WebSocket connected for user {username}. Total connections: {events.connections(token)}")
     
     try:
         while True:
             await websocket.receive_text()
     except Exception as e:
         print(f"WebSocket error: {e}")
-        if token in user_sessions and websocket in user_sessions[token]["websockets"]:
-            user_sessions[token]["websockets"].remove(websocket)
-            print(f"WebSocket disconnected for user {user_sessions[token]['username']}. Remaining connections: {len(user_sessions[token]['websockets'])}")
+    finally:
+        events.unsubscribe(subscriber)
+        print(f"WebSocket disconnected for user {username}. Remaining connections: {events.connections(token)}")
 
 # Mount static files
 app.mount("/", StaticFiles(directory="client", html=True), name="static")
\ No newline at end of file
@@ -1,16 +1,25 @@
 # Internal FR - Source Code
 import asyncio
+import os
 from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp.types import Tool as MCPTool
 from langgraph.prebuilt import create_react_agent
 from langchain_aws import ChatBedrock
-from langgraph.checkpoint.memory import InMemorySaver
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
 import random
 import string
 import json
+from conversation_store import ConversationStore
+from prompt_window import PromptWindow
 
-checkpointer = InMemorySaver() 
-
-
+# Last known tool definitions per MCP server, so a restart can build the agent before the servers answer
+TOOL_MANIFEST_PATH = os.getenv('BMO_TOOL_MANIFEST', 'mcp_tool_manifest.json')
+MCP_DISCOVERY_TIMEOUT = float(os.getenv('BMO_MCP_DISCOVERY_TIMEOUT', '15'))
+MCP_RETRY_BASE = float(os.getenv('BMO_MCP_RETRY_BASE', '1'))
+MCP_RETRY_MAX = float(os.getenv('BMO_MCP_RETRY_MAX', '60'))
 
 def generate_random_string(length: int) -> str:
     # Define the characters that can be used in the random string
@@ -21,11 +30,131 @@ def generate_random_string(length: int) -> str:
     
     return random_string
 
+# Tool argument filled from the run config instead of by the model
+SESSION_TOKEN_ARG = "auth_token"
+
+def bind_session_token(tool):
+    """Hide ``auth_token`` from the model and inject the caller's token on every call.
+
+    BMO MCP tools accept the REST session token as an argument. The model never sees it;
+    it is taken from ``config["configurable"]["auth_token"]`` set by ``MCPAgent.question``,
+    so each user's tool calls run with that user's own session.
+    """
+    schema = tool.args_schema
+    if not isinstance(schema, dict) or SESSION_TOKEN_ARG not in schema.get("properties", {}):
+        return tool
+    visible_schema = {
+        **schema,
+        "properties": {name: prop for name, prop in schema["properties"].items() if name != SESSION_TOKEN_ARG},
+        "required": [name for name in schema.get("required", []) if name != SESSION_TOKEN_ARG],
+    }
+
+    async def call_with_token(config: RunnableConfig, **arguments):
+        token = config.get("configurable", {}).get(SESSION_TOKEN_ARG)
+        if token:
+            arguments[SESSION_TOKEN_ARG] = token
+        return await tool.coroutine(**arguments)
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=visible_schema,
+        coroutine=call_with_token,
+        response_format=tool.response_format,
+        metadata=tool.metadata,
+    )
+
+def message_text(content):
+    """Plain text of a message or chunk; Bedrock models return a list of content blocks."""
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content
+                   if isinstance(block, dict) and block.get("type") == "text")
+
+USAGE_KEYS = ("input_tokens", "output_tokens", "total_tokens")
+
+def summarize_turn(messages, verbose=False):
+    """Project the thread state down to what a client needs for the latest turn.
+
+    The compact form has the final answer, one summary per tool call and summed token
+    usage. ``verbose`` adds ``trace``, the messages of this turn only; earlier turns are
+    never returned, so the payload does not grow with conversation length.
+    """
+    start = max((i for i, m in enumerate(messages) if m.type == "human"), default=-1)
+    turn = messages[start + 1:]
+    results = {m.tool_call_id: m for m in turn if m.type == "tool"}
+
+    tool_calls = []
+    usage = dict.fromkeys(USAGE_KEYS, 0)
+    for m in turn:
+        if m.type != "ai":
+            continue
+        for key in USAGE_KEYS:
+            usage[key] += (getattr(m, "usage_metadata", None) or {}).get(key, 0)
+        for call in m.tool_calls:
+            result = results.get(call["id"])
+            tool_calls.append({
+                "name": call["name"],
+                "args": call["args"],
+                "status": result.status if result is not None else "missing",
+                "result_chars": len(message_text(result.content)) if result is not None else 0,
+            })
+
+    summary = {
+        "answer": message_text(turn[-1].content) if turn else "",
+        "tool_calls": tool_calls,
+        "usage": usage,
+    }
+    if verbose:
+        trace = []
+        for m in turn:
+            entry = {"type": m.type, "content": message_text(m.content)}
+            if m.type == "ai" and m.tool_calls:
+                entry["tool_calls"] = m.tool_calls
+            if m.type == "tool":
+                entry.update(name=m.name, tool_call_id=m.tool_call_id, status=m.status)
+            trace.append(entry)
+        summary["trace"] = trace
+    return summary
+
+def tool_manifest_entry(tool):
+    """MCP tool definition of a LangChain tool loaded by langchain-mcp-adapters."""
+    return {
+        "name": tool.name,
+        "description": tool.description,
+        "inputSchema": tool.args_schema,
+        "annotations": tool.metadata,
+    }
+
+def load_tool_manifest(path=TOOL_MANIFEST_PATH):
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"*** Ignoring unreadable tool manifest {path}: {e}")
+        return {}
+
+def save_tool_manifest(manifest, path=TOOL_MANIFEST_PATH):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temp_path, path)
+
 class MCPAgent:
     def __init__(self):
         self.model_id = "anthropic.claude-3-5-sonnet-20240620-v1:0"
         self.client = None
         self.agent = None
+        self.model = None
+        self.system_prompt = None
+        self.checkpointer = None
+        self.server_tools = {}  # {server: [LangChain tools]}
+        self.server_status = {}  # {server: {"state", "tools", "attempts", "error"}}
+        self._discovery_tasks = []
+        self.conversations = ConversationStore()
+        self.prompt_window = PromptWindow()
         self.config = {
             "configurable": {
                 "thread_id": "1"  
@@ -34,7 +163,12 @@ class MCPAgent:
 
 
     async def initialize(self):
+        """Build the agent from cached tool manifests, then discover live tools in the background.
 
+        Returns without waiting for any MCP server. Each server is retried with exponential
+        backoff until it answers; the agent is rebuilt as servers come up, and works with the
+        tools of whichever servers are available meanwhile.
+        """
         config_mcp_server_file_path = 'config_mcp_server.json'
 
         # Read the JSON file as a string
@@ -45,36 +179,102 @@ class MCPAgent:
 
         self.client = MultiServerMCPClient(config_mcp_server_config)
 
-    #    async with client.session(server_name) as session:
-    #        tools = await load_mcp_tools(session)
-
-        # await self.client.__aenter__()
-        print("*** Getting tools:")
-        tools = await self.client.get_tools()
-        print(f"*** Found tools: {len(tools)}")
-        for tool in tools:
-            print(tool.name)        
-
         # Read system prompt from file
         with open('MCP_SYSTEM_PROMPT.md', 'r') as file:
-            system_prompt = file.read().strip()
+            self.system_prompt = file.read().strip()
 
-        bedrock_model = ChatBedrock(
+        self.model = ChatBedrock(
             model_id=self.model_id,
             region_name="us-east-1"  # Change to your preferred region
         ) 
 
+        self.checkpointer = await self.conversations.open()
+
+        manifest = load_tool_manifest()
+        for server, connection in self.client.connections.items():
+            cached = manifest.get(server) or []
+            # Cached tools open a session to the server per call, just like discovered ones
+            self.server_tools[server] = [
+                convert_mcp_tool_to_langchain_tool(None, MCPTool.model_validate(entry), connection=connection)
+                for entry in cached
+            ]
+            self.server_status[server] = {
+                "state": "cached" if cached else "connecting",
+                "tools": len(cached),
+                "attempts": 0,
+                "error": None,
+            }
+        self.build_agent()
+
+        self._discovery_tasks = [asyncio.create_task(self.discover_tools(server))
+                                 for server in self.client.connections]
+
+    async def discover_tools(self, server):
+        status = self.server_status[server]
+        delay = MCP_RETRY_BASE
+        while True:
+            status["attempts"] += 1
+            try:
+                tools = await asyncio.wait_for(self.client.get_tools(server_name=server), MCP_DISCOVERY_TIMEOUT)
+                break
+            except Exception as e:
+                status["error"] = str(e) or type(e).__name__
+                if status["state"] != "cached":
+                    status["state"] = "retrying"
+                print(f"*** MCP server {server} unavailable ({status['error']}), retrying in {delay:g}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MCP_RETRY_MAX)
+
+        self.server_tools[server] = tools
+        status.update(state="connected", tools=len(tools), error=None)
+        print(f"*** Found tools on {server}: {len(tools)}")
+        for tool in tools:
+            print(tool.name)
+        self.build_agent()
+
+        manifest = load_tool_manifest()
+        manifest[server] = [tool_manifest_entry(tool) for tool in tools]
+        try:
+            save_tool_manifest(manifest)
+        except OSError as e:
+            print(f"*** Could not save tool manifest: {e}")
+
+    def build_agent(self):
+        tools = [bind_session_token(tool) for server_tools in self.server_tools.values() for tool in server_tools]
+        if not tools:
+            print("*** No MCP tools available yet, agent not created")
+            return
         self.agent = create_react_agent(
-            model=bedrock_model,
+            model=self.model,
             tools=tools,
-            prompt=system_prompt,
-            checkpointer=checkpointer
-        )        
-        print("*** Agent created")
+            prompt=self.system_prompt,
+            pre_model_hook=self.prompt_window.trim,
+            checkpointer=self.checkpointer
+        )
+        print(f"*** Agent created with {len(tools)} tools")
+
+    @property
+    def ready(self):
+        return self.agent is not None
+
+    def status(self):
+        states = [server["state"] for server in self.server_status.values()]
+        if not self.ready:
+            state = "starting" if self.client is None or "connecting" in states else "unavailable"
+        else:
+            state = "ready" if states and all(s == "connected" for s in states) else "degraded"
+        return {"state": state, "ready": self.ready, "servers": self.server_status}
 
     async def cleanup(self):
-        if self.client:
-            await self.client.__aexit__(None, None, None)
+        # Tool calls open their own MCP sessions, so only the discovery loops need stopping
+        for task in self._discovery_tasks:
+            task.cancel()
+        await self.conversations.close()
+
+    async def forget(self, token):
+        """Delete the conversation thread of a session that has ended."""
+        if self.conversations.saver is not None:
+            await self.conversations.delete(token)
 
     def new_chat(self):
         new_id = generate_random_string(25)
@@ -82,15 +282,66 @@ class MCPAgent:
         print(f"New thread id: {new_id}")
         return new_id
 
-    async def question(self, message, token):
+    async def question(self, message, token, verbose=False):
         print(f"Asking: {message} usintg token/thread_id: {token}")
-        user_config = {"configurable": {"thread_id": token}}
+        user_config = {"configurable": {"thread_id": token, SESSION_TOKEN_ARG: token}}
+        await self.conversations.touch(token)
 
         test_response = await self.agent.ainvoke(
             {"messages": [{"role": "user", "content": message}]},
             user_config
         )
-        return test_response
+        summary = summarize_turn(test_response["messages"], verbose)
+        summary["prompt_window"] = self.prompt_window.pop_turn_stats(token)
+        print(f"Prompt window: {summary['prompt_window']}")
+        await self.conversations.compact_history(self.agent, user_config)
+        return summary
+
+    async def record_turn(self, message, token, answer):
+        """Append a question answered outside the agent (e.g. from the answer cache) to the thread."""
+        user_config = {"configurable": {"thread_id": token}}
+        await self.conversations.touch(token)
+        await self.agent.aupdate_state(
+            user_config,
+            {"messages": [HumanMessage(content=message), AIMessage(content=answer)]},
+            as_node="agent"
+        )
+
+    async def stream_question(self, message, token, send_event, verbose=False):
+        """Run one turn with ``astream_events`` and forward progress to ``send_event``.
+
+        ``send_event`` is awaited with ``chat_token`` events for every model text chunk and
+        ``chat_tool_start``/``chat_tool_end`` events around each tool call. Returns the same
+        ``summarize_turn`` projection as ``question`` once the ReAct loop has finished.
+        """
+        print(f"Streaming: {message} using token/thread_id: {token}")
+        user_config = {"configurable": {"thread_id": token, SESSION_TOKEN_ARG: token}}
+        await self.conversations.touch(token)
+
+        async for event in self.agent.astream_events(
+            {"messages": [{"role": "user", "content": message}]},
+            user_config,
+            version="v2"
+        ):
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                text = message_text(event["data"]["chunk"].content)
+                if text:
+                    await send_event({"type": "chat_token", "text": text})
+            elif kind == "on_chat_model_start":
+                await send_event({"type": "chat_turn"})
+            elif kind == "on_tool_start":
+                await send_event({"type": "chat_tool_start", "tool": event["name"],
+                                  "input": event["data"].get("input")})
+            elif kind == "on_tool_end":
+                await send_event({"type": "chat_tool_end", "tool": event["name"]})
+
+        state = await self.agent.aget_state(user_config)
+        summary = summarize_turn(state.values["messages"], verbose)
+        summary["prompt_window"] = self.prompt_window.pop_turn_stats(token)
+        print(f"Prompt window: {summary['prompt_window']}")
+        await self.conversations.compact_history(self.agent, user_config)
+        return summary
 
 # Example usage
 async def main():
@@ -53,4 +53,21 @@ class BankCreateRequest(BaseModel):
 
 class BankUpdateRequest(BaseModel):
     aba_code: str
-    name: str
\ No newline at end of file
+    name: str
+
+class BatchReportErrorsRequest(BaseModel):
+    report_ids: List[int]
+
+class StatusUpdateItem(BaseModel):
+    report_id: int
+    is_accepted: bool
+
+class BatchStatusUpdateRequest(BaseModel):
+    updates: List[StatusUpdateItem]
+
+class CommentItem(BaseModel):
+    error_id: int
+    comment: str
+
+class BatchCommentRequest(BaseModel):
+    comments: List[CommentItem]
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""Pre-model hook that bounds what each Bedrock call sees of a conversation thread.
+
+The checkpointed history is left untouched; ``PromptWindow.trim`` only builds the
+``llm_input_messages`` for one model call. It keeps the last ``max_turns`` turns,
+collapses tool results from earlier turns to a one-line reference and then drops
+the oldest turns until the window fits ``max_tokens``. The system prompt is added
+by the agent after the hook, so it is always sent.
+"""
+import os
+import threading
+
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import RunnableConfig
+
+PROMPT_MAX_TURNS = int(os.getenv('BMO_PROMPT_TURNS', '6'))
+PROMPT_MAX_TOKENS = int(os.getenv('BMO_PROMPT_TOKENS', '8000'))
+# Tool results from earlier turns longer than this are replaced by a reference
+PROMPT_TOOL_CHARS = int(os.getenv('BMO_PROMPT_TOOL_CHARS', '600'))
+
+def collapse_tool_message(message, max_chars=PROMPT_TOOL_CHARS):
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    if len(content) <= max_chars:
+        return message
+    first_line = content.strip().splitlines()[0][:200] if content.strip() else ""
+    summary = (f"[Result of {message.name or 'tool'} from an earlier turn omitted: "
+               f"{len(content)} chars. It began: {first_line} ... Call the tool again if the details are needed.]")
+    # Same id and tool_call_id, so the tool call it answers stays paired
+    return message.model_copy(update={"content": summary})
+
+class PromptWindow:
+    """Builds the model input for each call and records the tokens it saved per thread."""
+
+    def __init__(self, max_turns=PROMPT_MAX_TURNS, max_tokens=PROMPT_MAX_TOKENS, tool_chars=PROMPT_TOOL_CHARS):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.tool_chars = tool_chars
+        self._lock = threading.Lock()
+        self._turns = {}  # {thread_id: stats for the turn in progress}
+        self.totals = {"model_calls": 0, "tokens_before": 0, "tokens_after": 0}
+
+    def window(self, messages):
+        starts = [i for i, message in enumerate(messages) if message.type == "human"] or [0]
+        starts = starts[-self.max_turns:]
+        current = starts[-1]
+        kept = [collapse_tool_message(message, self.tool_chars) if message.type == "tool" and i < current else message
+                for i, message in enumerate(messages) if i >= starts[0]]
+        starts = [start - starts[0] for start in starts]
+
+        sizes = [count_tokens_approximately([message]) for message in kept]
+        total = sum(sizes)
+        first = 0
+        for start in starts[1:]:
+            if total <= self.max_tokens:
+                break
+            total -= sum(sizes[first:start])
+            first = start
+        return kept[first:]
+
+    def trim(self, state, config: RunnableConfig):
+        """``pre_model_hook`` for ``create_react_agent``."""
+        messages = state["messages"]
+        trimmed = self.window(messages)
+        before = count_tokens_approximately(messages)
+        after = count_tokens_approximately(trimmed)
+        thread_id = config.get("configurable", {}).get("thread_id")
+        with self._lock:
+            turn = self._turns.setdefault(thread_id, {"model_calls": 0, "tokens_before": 0, "tokens_after": 0})
+            for stats in (turn, self.totals):
+                stats["model_calls"] += 1
+                stats["tokens_before"] += before
+                stats["tokens_after"] += after
+        return {"llm_input_messages": trimmed}
+
+    def pop_turn_stats(self, thread_id):
+        """Approximate input tokens with and without trimming, summed over the turn's model calls."""
+        with self._lock:
+            turn = self._turns.pop(thread_id, {"model_calls": 0, "tokens_before": 0, "tokens_after": 0})
+        return {**turn, "tokens_saved": turn["tokens_before"] - turn["tokens_after"]}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_turns": self.max_turns,
+                "max_tokens": self.max_tokens,
+                "tool_chars": self.tool_chars,
+                **self.totals,
+                "tokens_saved": self.totals["tokens_before"] - self.totals["tokens_after"],
+            }
@@ -0,0 +1,374 @@
+"""Synchronous data-access functions used by the FastAPI endpoints.
+
+Every function takes a checked-out SQLite connection as its first argument and is
+meant to be run through ``database.run_db`` so the query executes on the DB thread
+pool instead of the event loop.
+"""
+import base64
+import binascii
+import json
+
+class ConflictError(Exception):
+    """Raised when a write is rejected by a business rule (mapped to HTTP 400)."""
+
+# WHERE clauses for the report status filter
+STATUS_FILTERS = {
+    "accepted": "r.is_accepted = 1",
+    "rejected": "r.is_accepted = 0 AND r.has_errors = 1",
+    "pending": "r.is_accepted IS NULL",
+}
+
+SESSION_COLUMNS = """
+    SELECT s.token, s.user_id, u.username, s.role, s.expires_at, s.last_seen
+    FROM sessions s
+    JOIN users u ON u.id = s.user_id
+"""
+
+def load_sessions(conn, now):
+    """Every unexpired session with its user, least recently seen first."""
+    rows = conn.execute(f"{SESSION_COLUMNS} WHERE s.expires_at > ? ORDER BY s.last_seen", (now,)).fetchall()
+    return [dict(row) for row in rows]
+
+def get_session(conn, token, now):
+    row = conn.execute(f"{SESSION_COLUMNS} WHERE s.token = ? AND s.expires_at > ?", (token, now)).fetchone()
+    return dict(row) if row else None
+
+def save_session(conn, token, user_id, role, expires_at, last_seen):
+    conn.execute(
+        "INSERT OR REPLACE INTO sessions (token, user_id, role, expires_at, last_seen) VALUES (?, ?, ?, ?, ?)",
+        (token, user_id, role, expires_at, last_seen)
+    )
+    conn.commit()
+
+def touch_sessions(conn, updates):
+    """Write many (token, user_id, role, expires_at, last_seen) activity updates in one transaction.
+
+    A session whose row was purged meanwhile (by a worker that had not seen this
+    activity yet) is inserted again; a revoked session is left revoked.
+    """
+    conn.executemany("""
+        INSERT INTO sessions (token, user_id, role, expires_at, last_seen) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (token) DO UPDATE SET expires_at = excluded.expires_at, last_seen = excluded.last_seen
+        WHERE sessions.expires_at > 0
+    """, updates)
+    conn.commit()
+
+def remove_session(conn, token, now):
+    """Revoke a session. The row stays until purged, so another worker's pending activity cannot revive it."""
+    conn.execute("UPDATE sessions SET expires_at = 0, last_seen = ? WHERE token = ?", (now, token))
+    conn.commit()
+
+def purge_expired_sessions(conn, cutoff):
+    """Delete sessions that expired, or were revoked, before ``cutoff``."""
+    deleted = conn.execute(
+        "DELETE FROM sessions WHERE expires_at <= ? AND last_seen <= ?", (cutoff, cutoff)
+    ).rowcount
+    conn.commit()
+    return deleted
+
+def find_user(conn, username):
+    user = conn.execute(
+        "SELECT id, username, password, role FROM users WHERE username = ?",
+        (username,)
+    ).fetchone()
+    return dict(user) if user else None
+
+def list_banks(conn):
+    banks = conn.execute("""
+        SELECT id, aba_code, name
+        FROM banks
+        ORDER BY name
+    """).fetchall()
+    return [dict(bank) for bank in banks]
+
+def get_report_statistics(conn):
+    """Dashboard aggregates read from the trigger-maintained summary tables.
+
+    Cost depends on the number of banks and error types, not on the number of reports.
+    """
+    by_bank = [dict(row) for row in conn.execute("""
+        SELECT s.bank_id, b.aba_code, b.name as bank_name,
+               s.reports, s.pending, s.accepted, s.rejected, s.with_errors, s.errors
+        FROM report_stats s
+        JOIN banks b ON b.id = s.bank_id
+        ORDER BY s.errors DESC, s.reports DESC, b.name
+    """)]
+    by_type = [dict(row) for row in conn.execute("""
+        SELECT error_type, errors, comments
+        FROM error_type_stats
+        WHERE errors > 0 OR comments > 0
+        ORDER BY errors DESC, error_type
+    """)]
+
+    totals = {column: sum(bank[column] for bank in by_bank)
+              for column in ("reports", "pending", "accepted", "rejected", "with_errors", "errors")}
+    decided = totals["reports"] - totals["pending"]
+    for bank in by_bank:
+        bank_decided = bank["reports"] - bank["pending"]
+        bank["acceptance_rate"] = round(bank["accepted"] / bank_decided, 4) if bank_decided else None
+    return {
+        "reports": {
+            "total": totals["reports"],
+            "pending": totals["pending"],
+            "accepted": totals["accepted"],
+            "rejected": totals["rejected"],
+            "with_errors": totals["with_errors"],
+            "acceptance_rate": round(totals["accepted"] / decided, 4) if decided else None,
+        },
+        "banks": len(by_bank),
+        "errors": {
+            "total": totals["errors"],
+            "comments": sum(row["comments"] for row in by_type),
+            "by_type": by_type,
+        },
+        "by_bank": by_bank,
+    }
+
+REPORT_PAGE_SIZE = 100
+MAX_REPORT_PAGE_SIZE = 500
+
+def encode_cursor(submission_date, report_id):
+    return base64.urlsafe_b64encode(json.dumps([submission_date, report_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        submission_date, report_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(submission_date), int(report_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+def list_reports(conn, limit=REPORT_PAGE_SIZE, cursor=None, bank_id=None, aba_code=None,
+                 date_from=None, date_to=None, has_errors=None, status=None, search=None, is_accepted=None):
+    """Return one page of reports, newest first, keyset-paginated on (submission_date, id).
+
+    ``cursor`` is the ``next_cursor`` of the previous page. Dates are inclusive
+    ``YYYY-MM-DD`` bounds on ``submission_date``. ``is_accepted`` matches the decision
+    alone, whereas the ``rejected`` status only covers rejected reports with errors.
+    """
+    conditions = []
+    params = []
+    if status is not None:
+        conditions.append(STATUS_FILTERS[status])
+    if bank_id is not None:
+        conditions.append("r.bank_id = ?")
+        params.append(bank_id)
+    if aba_code is not None:
+        conditions.append("b.aba_code = ?")
+        params.append(aba_code)
+    if date_from is not None:
+        conditions.append("r.submission_date >= ?")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("r.submission_date <= ?")
+        params.append(date_to)
+    if has_errors is not None:
+        conditions.append("r.has_errors = ?")
+        params.append(1 if has_errors else 0)
+    if is_accepted is not None:
+        conditions.append("r.is_accepted = ?")
+        params.append(1 if is_accepted else 0)
+    if search:
+        conditions.append("(b.name LIKE ? OR r.report_code LIKE ?)")
+        params.extend([f"%{search}%", f"%{search}%"])
+    if cursor is not None:
+        conditions.append("(r.submission_date, r.id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    reports = conn.execute(f"""
+        SELECT r.id, r.report_code, r.submission_date, r.has_errors, r.is_accepted,
+               b.aba_code, b.name as bank_name
+        FROM reports r
+        JOIN banks b ON r.bank_id = b.id
+        {where_clause}
+        ORDER BY r.submission_date DESC, r.id DESC
+        LIMIT ?
+    """, params + [limit + 1]).fetchall()
+
+    # One extra row tells us whether another page exists
+    page = [dict(report) for report in reports[:limit]]
+    next_cursor = None
+    if len(reports) > limit:
+        next_cursor = encode_cursor(page[-1]['submission_date'], page[-1]['id'])
+    return {"reports": page, "next_cursor": next_cursor, "limit": limit}
+
+# Upper bound on ids/items accepted by one batch request
+MAX_BATCH_SIZE = 500
+
+def placeholders(values):
+    return ", ".join("?" for _ in values)
+
+# Comments embedded per error by get_errors_for_reports; the rest are paged with list_error_comments
+ERROR_COMMENT_LIMIT = 20
+COMMENT_PAGE_SIZE = 50
+MAX_COMMENT_PAGE_SIZE = 500
+
+def get_errors_for_reports(conn, report_ids, comment_limit=ERROR_COMMENT_LIMIT):
+    """Return {report_id: [errors]} for all given reports in one query.
+
+    Each error carries its first ``comment_limit`` comments as objects, oldest first, its
+    ``comment_count`` and a ``comments_next_cursor`` for list_error_comments when more exist.
+    """
+    report_ids = list(dict.fromkeys(report_ids))
+    result = {report_id: [] for report_id in report_ids}
+    if not report_ids:
+        return result
+    # Both subqueries walk idx_error_comments_error and stop after comment_limit rows
+    errors = conn.execute(f"""
+        SELECT ve.report_id, ve.id, ve.error_type, ve.error_message, ve.field_name,
+               (SELECT COUNT(*) FROM error_comments WHERE error_id = ve.id) AS comment_count,
+               (SELECT json_group_array(json_object('id', c.id, 'username', c.username,
+                                                    'comment', c.comment, 'created_at', c.created_at))
+                FROM (SELECT ec.id, u.username, ec.comment, ec.created_at
+                      FROM error_comments ec
+                      LEFT JOIN users u ON u.id = ec.user_id
+                      WHERE ec.error_id = ve.id
+                      ORDER BY ec.id
+                      LIMIT ?) c) AS comments
+        FROM validation_errors ve
+        WHERE ve.report_id IN ({placeholders(report_ids)})
+        ORDER BY ve.report_id, ve.id
+    """, [comment_limit, *report_ids]).fetchall()
+
+    for error in errors:
+        error_dict = dict(error)
+        report_id = error_dict.pop('report_id')
+        # json_group_array does not promise the subquery's order
+        comments = sorted(json.loads(error_dict['comments']), key=lambda comment: comment['id'])
+        error_dict['comments'] = comments
+        error_dict['comments_next_cursor'] = (
+            str(comments[-1]['id']) if comments and error_dict['comment_count'] > len(comments) else None
+        )
+        result[report_id].append(error_dict)
+    return result
+
+def get_report_errors(conn, report_id, comment_limit=ERROR_COMMENT_LIMIT):
+    return get_errors_for_reports(conn, [report_id], comment_limit)[report_id]
+
+def list_error_comments(conn, error_id, limit=COMMENT_PAGE_SIZE, cursor=None):
+    """Return one page of an error's comments, oldest first, keyset-paginated on id.
+
+    ``cursor`` is ``comments_next_cursor`` of the error or ``next_cursor`` of the previous page.
+    """
+    after_id = 0
+    if cursor is not None:
+        try:
+            after_id = int(cursor)
+        except ValueError:
+            raise ValueError("Invalid cursor")
+    rows = conn.execute("""
+        SELECT ec.id, u.username, ec.comment, ec.created_at
+        FROM error_comments ec
+        LEFT JOIN users u ON u.id = ec.user_id
+        WHERE ec.error_id = ? AND ec.id > ?
+        ORDER BY ec.id
+        LIMIT ?
+    """, (error_id, after_id, limit + 1)).fetchall()
+    comments = [dict(row) for row in rows[:limit]]
+    next_cursor = str(comments[-1]['id']) if len(rows) > limit else None
+    return {"comments": comments, "next_cursor": next_cursor, "limit": limit}
+
+COMMENT_COLUMNS = """
+    SELECT ec.id, ec.error_id, ve.report_id, u.username, ec.comment, ec.created_at
+    FROM error_comments ec
+    JOIN validation_errors ve ON ve.id = ec.error_id
+    LEFT JOIN users u ON u.id = ec.user_id
+"""
+
+def add_error_comment(conn, error_id, user_id, comment):
+    """Insert a comment and return it with its report id, author and timestamp."""
+    comment_id = conn.execute(
+        "INSERT INTO error_comments (error_id, user_id, comment) VALUES (?, ?, ?)",
+        (error_id, user_id, comment)
+    ).lastrowid
+    conn.commit()
+    row = conn.execute(f"{COMMENT_COLUMNS} WHERE ec.id = ?", (comment_id,)).fetchone()
+    return dict(row) if row else None
+
+def update_report_status(conn, report_id, is_accepted):
+    # Check if trying to accept a report with errors
+    if is_accepted:
+        report = conn.execute(
+            "SELECT has_errors FROM reports WHERE id = ?",
+            (report_id,)
+        ).fetchone()
+
+        if report and report['has_errors']:
+            raise ConflictError("Cannot accept report that contains validation errors")
+
+    conn.execute(
+        "UPDATE reports SET is_accepted = ? WHERE id = ?",
+        (is_accepted, report_id)
+    )
+    conn.commit()
+
+def add_error_comments(conn, user_id, comments):
+    """Insert many (error_id, comment) pairs in one transaction; unknown error ids are reported, not inserted."""
+    conn.execute("BEGIN IMMEDIATE")
+    error_ids = list({error_id for error_id, _ in comments})
+    existing = {row[0] for row in conn.execute(
+        f"SELECT id FROM validation_errors WHERE id IN ({placeholders(error_ids)})", error_ids
+    )} if error_ids else set()
+
+    rows = [(error_id, user_id, comment) for error_id, comment in comments if error_id in existing]
+    failed = [{"error_id": error_id, "error": "Validation error not found"}
+              for error_id, _ in comments if error_id not in existing]
+    # The write lock is held, so the new rows get the ids right after the current maximum
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM error_comments").fetchone()[0]
+    conn.executemany("INSERT INTO error_comments (error_id, user_id, comment) VALUES (?, ?, ?)", rows)
+    added = [dict(row) for row in conn.execute(f"{COMMENT_COLUMNS} WHERE ec.id > ? ORDER BY ec.id", (last_id,))]
+    conn.commit()
+    return {"added": len(rows), "failed": failed, "comments": added}
+
+def update_report_statuses(conn, updates):
+    """Apply many (report_id, is_accepted) decisions in one transaction.
+
+    Updates that break a rule (unknown report, accepting a report with errors) are
+    skipped and reported back; the rest are written with a single executemany.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    report_ids = list({report_id for report_id, _ in updates})
+    has_errors = {row[0]: row[1] for row in conn.execute(
+        f"SELECT id, has_errors FROM reports WHERE id IN ({placeholders(report_ids)})", report_ids
+    )} if report_ids else {}
+
+    rows = []
+    failed = []
+    for report_id, is_accepted in updates:
+        if report_id not in has_errors:
+            failed.append({"report_id": report_id, "error": "Report not found"})
+        elif is_accepted and has_errors[report_id]:
+            failed.append({"report_id": report_id, "error": "Cannot accept report that contains validation errors"})
+        else:
+            rows.append((is_accepted, report_id))
+    conn.executemany("UPDATE reports SET is_accepted = ? WHERE id = ?", rows)
+    conn.commit()
+    return {"updated": [report_id for _, report_id in rows], "failed": failed}
+
+def create_bank(conn, aba_code, name):
+    bank_id = conn.execute(
+        "INSERT INTO banks (aba_code, name) VALUES (?, ?)",
+        (aba_code, name)
+    ).lastrowid
+    conn.commit()
+    return bank_id
+
+def update_bank(conn, bank_id, aba_code, name):
+    conn.execute(
+        "UPDATE banks SET aba_code = ?, name = ? WHERE id = ?",
+        (aba_code, name, bank_id)
+    )
+    conn.commit()
+
+def delete_bank(conn, bank_id):
+    # Check if bank has any reports
+    report_count = conn.execute(
+        "SELECT COUNT(*) as count FROM reports WHERE bank_id = ?",
+        (bank_id,)
+    ).fetchone()['count']
+
+    if report_count > 0:
+        raise ConflictError(f"Cannot delete bank. It has {report_count} associated report(s).")
+
+    conn.execute("DELETE FROM banks WHERE id = ?", (bank_id,))
+    conn.commit()
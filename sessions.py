@@ -0,0 +1,174 @@
+"""Login sessions for the REST API and WebSocket.
+
+``SessionStore`` keeps every live session in memory, so authenticating a request is a
+dict lookup. Logins and logouts are written to the ``sessions`` table immediately;
+activity (``last_seen`` and the sliding ``expires_at``) is buffered and written in one
+batch every ``flush_interval`` seconds. On startup the table is loaded back, so tokens
+stay valid across restarts. Sessions expire ``ttl`` seconds after they were last used.
+The table is shared by all worker processes and decides: a session that looks expired
+here may have been extended by another worker, and rows are purged only
+``flush_interval`` seconds after their stored expiry, once every worker has written
+the activity it buffered.
+Beyond ``max_sessions`` the least recently used are dropped from memory only and are
+reloaded from the table on their next request.
+"""
+import asyncio
+import os
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import repository
+from database import run_db
+
+SESSION_TTL = float(os.getenv('BMO_SESSION_TTL', str(8 * 3600)))
+SESSION_MAX = int(os.getenv('BMO_SESSION_MAX', '10000'))
+SESSION_FLUSH_INTERVAL = float(os.getenv('BMO_SESSION_FLUSH_INTERVAL', '30'))
+
+@dataclass
+class SessionRecord:
+    token: str
+    user_id: int
+    username: str
+    role: str
+    expires_at: float
+    last_seen: float
+
+class SessionStore:
+    def __init__(self, ttl=SESSION_TTL, max_sessions=SESSION_MAX, flush_interval=SESSION_FLUSH_INTERVAL):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.flush_interval = flush_interval
+        self._sessions = OrderedDict()  # {token: SessionRecord}, least recently used first
+        self._dirty = set()  # tokens whose activity is not written yet
+        self._pending_evicted = {}  # {token: SessionRecord} dropped from memory before their flush
+        self._flush_task = None
+        self.hits = 0
+        self.loads = 0
+        self.rejected = 0
+        self.expired = 0
+        self.flushes = 0
+
+    async def start(self):
+        """Load all unexpired sessions and start the write-behind loop."""
+        now = time.time()
+        purged = await run_db(repository.purge_expired_sessions, now - self.flush_interval)
+        for row in await run_db(repository.load_sessions, now):
+            self._remember(SessionRecord(**row))
+        print(f"Restored {len(self._sessions)} sessions ({purged} expired sessions purged)")
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    async def create(self, user):
+        now = time.time()
+        record = SessionRecord(token=secrets.token_urlsafe(32), user_id=user['id'], username=user['username'],
+                               role=user['role'], expires_at=now + self.ttl, last_seen=now)
+        await run_db(repository.save_session, record.token, record.user_id, record.role,
+                     record.expires_at, record.last_seen)
+        self._remember(record)
+        return record
+
+    async def get(self, token):
+        """Return the live session for ``token`` and extend it, or ``None``."""
+        if not token:
+            return None
+        now = time.time()
+        record = self._sessions.get(token)
+        stale = record is not None and record.expires_at <= now
+        if stale:
+            # Another worker may have kept it alive; only the table can tell
+            self._sessions.pop(token, None)
+            self._dirty.discard(token)
+            record = None
+        if record is None:
+            # Expired here, dropped from memory by the LRU, or created by another worker process
+            row = await run_db(repository.get_session, token, now)
+            if row is None:
+                if stale:
+                    self.expired += 1
+                else:
+                    self.rejected += 1
+                return None
+            record = SessionRecord(**row)
+            self.loads += 1
+        else:
+            self.hits += 1
+        record.last_seen = now
+        record.expires_at = now + self.ttl
+        self._dirty.add(token)
+        self._remember(record)
+        return record
+
+    def forget(self, token):
+        """Drop a session another worker has removed from the table."""
+        self._sessions.pop(token, None)
+        self._dirty.discard(token)
+        self._pending_evicted.pop(token, None)
+
+    async def remove(self, token):
+        self._sessions.pop(token, None)
+        self._dirty.discard(token)
+        await run_db(repository.remove_session, token, time.time())
+
+    def _remember(self, record):
+        self._sessions[record.token] = record
+        self._sessions.move_to_end(record.token)
+        while len(self._sessions) > self.max_sessions:
+            token, evicted = self._sessions.popitem(last=False)
+            if token in self._dirty:
+                # Keep its activity for the next flush
+                self._pending_evicted[token] = evicted
+
+    async def flush(self):
+        """Write buffered activity and drop expired sessions."""
+        now = time.time()
+        tokens, self._dirty = self._dirty, set()
+        evicted, self._pending_evicted = self._pending_evicted, {}
+        updates = []
+        for token in tokens:
+            record = self._sessions.get(token) or evicted.get(token)
+            if record is not None:
+                updates.append((token, record.user_id, record.role, record.expires_at, record.last_seen))
+        if updates:
+            try:
+                await run_db(repository.touch_sessions, updates)
+            except Exception:
+                # Retry with the next flush
+                self._dirty |= tokens
+                self._pending_evicted = {**evicted, **self._pending_evicted}
+                raise
+        # Expired here; get() reloads any another worker has extended
+        expired = [token for token, record in self._sessions.items() if record.expires_at <= now]
+        for token in expired:
+            del self._sessions[token]
+        self.expired += len(expired)
+        # Leave other workers one flush to write activity they buffered for these rows
+        await run_db(repository.purge_expired_sessions, now - self.flush_interval)
+        self.flushes += 1
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Session flush failed: {e}")
+
+    def stats(self):
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl,
+            "pending_writes": len(self._dirty),
+            "hits": self.hits,
+            "loaded_from_db": self.loads,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "flushes": self.flushes,
+        }
@@ -1,98 +1,452 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+import os
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from fastmcp import FastMCP
+from database import db_pool, get_data_version, get_table_versions
 
 mcp = FastMCP("BMO SQL MCP Server")
-DATABASE_PATH = "bmo_data.db"
 
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Budgets for a single execute_sql_query result sent back to the LLM
+MAX_RESULT_ROWS = int(os.getenv('SQL_MAX_RESULT_ROWS', '200'))
+MAX_RESULT_BYTES = int(os.getenv('SQL_MAX_RESULT_BYTES', '50000'))
+FETCH_CHUNK_SIZE = 100
+
+# Query governor: wall-clock limit and full-scan guard for agent-generated SQL
+QUERY_TIMEOUT_SECONDS = float(os.getenv('SQL_QUERY_TIMEOUT', '10'))
+FULL_SCAN_ROW_THRESHOLD = int(os.getenv('SQL_FULL_SCAN_ROWS', '10000'))
+QUERY_GUARD_MODE = os.getenv('SQL_QUERY_GUARD', 'warn')  # 'warn' or 'reject'
+PROGRESS_INTERVAL = 1000  # SQLite VM instructions between progress handler calls
+
+# Result cache for repeated read-only queries
+QUERY_CACHE_SIZE = int(os.getenv('SQL_QUERY_CACHE_SIZE', '256'))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv('SQL_QUERY_CACHE_TTL', '300'))
+
+# Introspection details the agent does not need; sample values are never read from secrets
+HIDDEN_TABLES = {"schema_version", "table_versions"}
+NO_SAMPLE_TABLES = {"sessions"}
+SENSITIVE_COLUMNS = {"password", "token"}
+SAMPLE_VALUES = 3
+
+class SchemaCache:
+    """Memoized schema introspection.
+
+    Table structure (columns, foreign keys, indexes) is rebuilt only when
+    ``PRAGMA schema_version`` changes. Row counts and sample values are refreshed
+    per table, only for tables whose ``table_versions`` write counter moved.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._schema_version = None
+        self._structure = {}
+        self._stats = {}  # table -> (write counter, {"row_count": ..., "samples": ...})
+        self.rebuilds = 0
+
+    def _introspect(self, conn):
+        structure = {}
+        tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'").fetchall()
+        for table in tables:
+            table_name = table[0]
+            if table_name in HIDDEN_TABLES:
+                continue
+            columns = conn.execute(f"PRAGMA table_info({table_name})").fetchall()
+            foreign_keys = conn.execute(f"PRAGMA foreign_key_list({table_name})").fetchall()
+            indexes = []
+            for index in conn.execute(f"PRAGMA index_list({table_name})").fetchall():
+                index_columns = conn.execute(f"PRAGMA index_info({index[1]})").fetchall()
+                indexes.append({"name": index[1], "unique": bool(index[2]), "columns": [col[2] for col in index_columns]})
+            
+            structure[table_name] = {
+                "columns": [{"name": col[1], "type": col[2], "not_null": bool(col[3]), "primary_key": bool(col[5])} for col in columns],
+                "foreign_keys": [{"column": fk[3], "references_table": fk[2], "references_column": fk[4]} for fk in foreign_keys],
+                "indexes": indexes,
+            }
+        return structure
+
+    def _table_stats(self, conn, table_name, columns):
+        stats = {"row_count": conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]}
+        if table_name not in NO_SAMPLE_TABLES:
+            samples = {}
+            for column in columns:
+                if column["name"] in SENSITIVE_COLUMNS:
+                    continue
+                rows = conn.execute(
+                    f'SELECT DISTINCT "{column["name"]}" FROM "{table_name}" WHERE "{column["name"]}" IS NOT NULL LIMIT {SAMPLE_VALUES}'
+                ).fetchall()
+                samples[column["name"]] = [row[0] for row in rows]
+            stats["sample_values"] = samples
+        return stats
+
+    def get(self, conn) -> Dict[str, Dict[str, Any]]:
+        """Return {table: structure + row_count + sample_values}, refreshing only what changed."""
+        with self._lock:
+            schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            if schema_version != self._schema_version:
+                self._structure = self._introspect(conn)
+                self._stats = {}
+                self._schema_version = schema_version
+                self.rebuilds += 1
+            
+            versions = get_table_versions(conn)
+            tables = {}
+            for table_name, structure in self._structure.items():
+                # Tables without a write counter (e.g. sessions) are recounted on every call
+                version = versions.get(table_name)
+                cached = self._stats.get(table_name)
+                if cached is None or version is None or cached[0] != version:
+                    cached = (version, self._table_stats(conn, table_name, structure["columns"]))
+                    self._stats[table_name] = cached
+                tables[table_name] = {**structure, **cached[1]}
+            return tables
+
+schema_cache = SchemaCache()
 
 @mcp.tool()
-def get_database_schema() -> Dict[str, Any]:
-    """Get complete database schema for BMO SQLite database.
+def get_database_schema(tables: Optional[List[str]] = None, compact: bool = False) -> Dict[str, Any]:
+    """Get database schema for BMO SQLite database.
     
     Database System: SQLite 3.x
     SQL Dialect: SQLite SQL (standard SQL with SQLite extensions)
     
-    Returns schema with tables, columns, types, constraints, and relationships.
-    Use this before generating SQL queries to ensure accuracy.
+    Returns schema with tables, columns, types, constraints, relationships, indexes,
+    row counts and a few sample values per column.
+    Use this before generating SQL queries to ensure accuracy. The schema is cached on the
+    server, so repeated calls are cheap.
+    
+    Parameters:
+    - tables: Only describe these tables (default: all tables)
+    - compact: Return only column names per table, to save tokens when you already know the types
     """
-    print("[SQL] Getting complete database schema")
+    print(f"[SQL] Getting database schema (tables={tables}, compact={compact})")
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db_pool.connection() as conn:
+            all_tables = schema_cache.get(conn)
         
+        selected = all_tables if not tables else {name: all_tables[name] for name in tables if name in all_tables}
         schema = {
             "database_type": "SQLite",
             "sql_dialect": "SQLite SQL",
-            "tables": {}
         }
-        
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-        tables = cursor.fetchall()
-        
-        for table in tables:
-            table_name = table[0]
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = cursor.fetchall()
-            cursor.execute(f"PRAGMA foreign_key_list({table_name})")
-            foreign_keys = cursor.fetchall()
-            
-            schema["tables"][table_name] = {
-                "columns": [{"name": col[1], "type": col[2], "not_null": bool(col[3]), "primary_key": bool(col[5])} for col in columns],
-                "foreign_keys": [{"column": fk[3], "references_table": fk[2], "references_column": fk[4]} for fk in foreign_keys]
-            }
-        
-        conn.close()
+        if compact:
+            schema["tables"] = {name: [col["name"] for col in table["columns"]] for name, table in selected.items()}
+        else:
+            schema["tables"] = selected
+        unknown = [name for name in (tables or []) if name not in all_tables]
+        if unknown:
+            schema["unknown_tables"] = unknown
         return schema
     except Exception as e:
         return {"error": str(e)}
 
-def format_as_markdown_table(data: List[Dict], columns: List[str]) -> str:
-    """Convert query results to markdown table format."""
-    if not data or not columns:
-        return "No data to display."
+def format_markdown_row(values) -> str:
+    return "| " + " | ".join(values) + " |"
+
+def iter_rows(cursor, chunk_size: int):
+    """Yield rows from the cursor in fetchmany() chunks instead of materializing fetchall()."""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
+
+def format_as_markdown_table(cursor, columns: List[str], offset: int = 0, limit: int = MAX_RESULT_ROWS,
+                             max_bytes: int = MAX_RESULT_BYTES) -> Tuple[str, int]:
+    """Stream query results into a markdown table within a row and byte budget.
+
+    Rows before ``offset`` are skipped, at most ``limit`` rows are rendered and rendering
+    stops early once the table would exceed ``max_bytes``. Remaining rows are only counted
+    so the truncation marker can report the total and the offset to continue from.
+    Returns the markdown text and the total number of result rows.
+    """
+    if not columns:
+        return "No data to display.", 0
+    
+    lines = [format_markdown_row(columns), format_markdown_row(["---"] * len(columns))]
+    size = sum(len(line) + 1 for line in lines)
+    total = 0
+    shown = 0
+    for row in iter_rows(cursor, FETCH_CHUNK_SIZE):
+        total += 1
+        if total <= offset or shown >= limit:
+            continue
+        line = format_markdown_row(["NULL" if value is None else str(value) for value in row])
+        if size + len(line) + 1 > max_bytes and shown > 0:
+            limit = shown
+            continue
+        lines.append(line)
+        size += len(line) + 1
+        shown += 1
+    
+    if total == 0:
+        return "No data to display.", total
+    if shown == 0:
+        return f"No rows at offset {offset}; the query returned {total} row(s).", total
+    if offset == 0 and shown == total:
+        return "\n".join(lines) + f"\n\n*{total} row(s) returned*", total
+    marker = f"*Showing rows {offset + 1}-{offset + shown} of {total}."
+    if offset + shown < total:
+        marker += f" Results truncated; call execute_sql_query again with offset={offset + shown} to continue."
+    return "\n".join(lines) + f"\n\n{marker}*", total
+
+# String literals and quoted identifiers keep their case and spacing when normalizing
+SQL_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+SQL_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+def normalize_sql(sql_query: str) -> str:
+    """Canonical form used as the cache key: no comments, collapsed whitespace, lowercase keywords."""
+    parts = SQL_QUOTED.split(sql_query)
+    normalized = []
+    for index, part in enumerate(parts):
+        if index % 2:
+            normalized.append(part)
+        else:
+            part = SQL_COMMENTS.sub(" ", part)
+            normalized.append(re.sub(r"\s+", " ", part).lower())
+    return "".join(normalized).strip().rstrip(";").strip()
+
+class QueryResultCache:
+    """LRU cache of rendered query results with a TTL.
+
+    Entries are tagged with the database data version (``table_versions`` write counters),
+    so any write from the API, a script or another process makes them stale.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (data_version, stored_at, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, key, data_version) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            version, stored_at, result = entry
+            if version != data_version or time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, data_version, result: str):
+        with self._lock:
+            self._entries[key] = (data_version, time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+query_cache = QueryResultCache()
+
+def is_read_only(normalized_sql: str) -> bool:
+    return normalized_sql.startswith(("select", "with", "values"))
+
+class QueryRejected(Exception):
+    """Raised by the query governor when a plan is too expensive to run."""
+
+# FROM/JOIN <table> [AS] <alias>; EXPLAIN QUERY PLAN reports aliases, not table names
+TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?", re.IGNORECASE)
+SQL_KEYWORDS = {"where", "join", "left", "right", "inner", "outer", "cross", "natural", "on", "using",
+                "group", "order", "limit", "union", "except", "intersect", "having", "window"}
+
+def estimate_row_count(conn, table: str) -> int:
+    """Cheap row estimate from the largest rowid (an index seek, not a COUNT(*) scan)."""
+    try:
+        row = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()
+        return row[0] or 0
+    except Exception:
+        return 0
+
+def check_query_plan(conn, sql_query: str) -> Tuple[List[str], int]:
+    """Run EXPLAIN QUERY PLAN and flag full scans of large tables.
+
+    Returns warnings and the estimated number of rows the query will read. Loops of one
+    SELECT are nested, so their scans multiply: ``SELECT * FROM a, b`` reads about
+    rows(a) x rows(b). Correlated subqueries run once per row of the loops around them.
+    In 'reject' mode a full table scan (no index at all) of a large table, or nested
+    scans whose product reaches the threshold, raises QueryRejected.
+    """
+    try:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql_query}").fetchall()
+    except Exception:
+        # Let the real execution report syntax errors
+        return [], 0
+    
+    aliases = {}
+    for table, alias in TABLE_REF.findall(sql_query):
+        aliases[table.lower()] = table
+        if alias and alias.lower() not in SQL_KEYWORDS:
+            aliases[alias.lower()] = table
     
-    header = "| " + " | ".join(columns) + " |"
-    separator = "| " + " | ".join(["---"] * len(columns)) + " |"
+    children = {}
+    for node_id, parent, _, detail in plan:
+        children.setdefault(parent, []).append((node_id, detail))
     
-    rows = []
-    for row in data:
-        values = [str(row.get(col, "NULL")) for col in columns]
-        rows.append("| " + " | ".join(values) + " |")
+    warnings = []
+    
+    def cost(parent):
+        """Rows read by the SELECT whose plan rows hang off ``parent``."""
+        scans = []
+        loop_rows = 1
+        correlated = 0
+        independent = 0
+        for node_id, detail in children.get(parent, []):
+            match = re.match(r"SCAN (\w+)(.*)", detail)
+            if match:
+                table = aliases.get(match.group(1).lower(), match.group(1))
+                rows = estimate_row_count(conn, table)
+                uses_index = "INDEX" in match.group(2)
+                scans.append((table, rows))
+                loop_rows *= max(rows, 1)
+                if rows >= FULL_SCAN_ROW_THRESHOLD:
+                    if QUERY_GUARD_MODE == "reject" and not uses_index:
+                        raise QueryRejected(
+                            f"Query rejected: full scan of {table} (~{rows} rows). "
+                            f"Add a WHERE clause on an indexed column or aggregate with GROUP BY."
+                        )
+                    warnings.append(f"full scan of {table} (~{rows} rows{', via index' if uses_index else ''})")
+            elif detail.startswith("CORRELATED"):
+                correlated += cost(node_id)
+            elif not detail.startswith("SEARCH"):
+                # Subqueries, CTEs, compound SELECTs: evaluated once
+                independent += cost(node_id)
+        
+        loops = [f"{table} (~{rows})" for table, rows in scans]
+        nested_rows = loop_rows
+        if correlated:
+            loops.append(f"correlated subquery (~{correlated})")
+            nested_rows *= correlated
+        if len(loops) > 1 and nested_rows >= FULL_SCAN_ROW_THRESHOLD:
+            joined = " x ".join(loops)
+            if QUERY_GUARD_MODE == "reject":
+                raise QueryRejected(
+                    f"Query rejected: nested scans of {joined} read ~{nested_rows} rows. "
+                    f"Join on indexed columns or filter each table first."
+                )
+            warnings.append(f"nested scans of {joined} (~{nested_rows} rows)")
+        return (loop_rows if scans else 0) + (loop_rows * correlated) + independent
     
-    return "\n".join([header, separator] + rows) + f"\n\n*{len(data)} row(s) returned*"
+    return warnings, cost(0)
 
 @mcp.tool()
-def execute_sql_query(sql_query: str) -> str:
+def execute_sql_query(sql_query: str, offset: int = 0, limit: Optional[int] = None) -> str:
     """Execute SQL queries against BMO SQLite database and return results as markdown table.
     
     SECURITY RESTRICTION: Only SELECT queries are allowed for data safety.
     Returns formatted markdown table for better readability.
+    
+    Results are capped per call (200 rows and about 50 KB by default). When a result is truncated the
+    footer reports the total row count and the offset to pass to fetch the next rows.
+    Prefer aggregation (COUNT, GROUP BY) or WHERE/LIMIT over paging through large tables.
+    
+    Queries run under a wall-clock limit (10 s by default) and are checked with EXPLAIN QUERY PLAN
+    first; full scans of large tables are flagged in the footer (or rejected if the server is
+    configured to). The footer also reports elapsed time, result rows and rows scanned.
+    
+    Identical read-only queries are answered from a cache until the underlying data changes.
+    
+    Parameters:
+    - sql_query: SQLite SELECT statement
+    - offset: Number of result rows to skip (continuation from a truncated result)
+    - limit: Maximum rows to return, up to 200
     """
     try:
-        print(f"[SQL] Executing SQL Query: {sql_query}") 
+        print(f"[SQL] Executing SQL Query: {sql_query} (offset={offset}, limit={limit})") 
         # if not sql_query.strip().upper().startswith('SELECT'):
         #     return "Error: Only SELECT queries are allowed for security reasons."
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(sql_query)
-        
-        results = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description] if cursor.description else []
-        data = [dict(row) for row in results]
+        row_limit = MAX_RESULT_ROWS if limit is None else max(0, min(limit, MAX_RESULT_ROWS))
+        offset = max(0, offset)
+        normalized = normalize_sql(sql_query)
+        cache_key = (normalized, offset, row_limit)
+        with db_pool.connection() as conn:
+            data_version = get_data_version(conn)
+            if is_read_only(normalized):
+                cached = query_cache.get(cache_key, data_version)
+                if cached is not None:
+                    print("[SQL] Served from result cache")
+                    return cached + "\n\n_Served from cache_"
+            
+            warnings, scanned_rows = check_query_plan(conn, sql_query)
+            
+            started = time.monotonic()
+            deadline = started + QUERY_TIMEOUT_SECONDS
+            vm_steps = 0
+            def on_progress():
+                nonlocal vm_steps
+                vm_steps += PROGRESS_INTERVAL
+                # A non-zero return interrupts the running statement
+                return 1 if time.monotonic() > deadline else 0
+            
+            conn.set_progress_handler(on_progress, PROGRESS_INTERVAL)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(sql_query)
+                columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                markdown_table, total_rows = format_as_markdown_table(cursor, columns, offset, row_limit)
+            except sqlite3.OperationalError as e:
+                if time.monotonic() > deadline:
+                    return (f"Error: Query exceeded the {QUERY_TIMEOUT_SECONDS:g}s time limit and was interrupted. "
+                            f"Narrow it with WHERE clauses on indexed columns or aggregate instead.")
+                raise
+            finally:
+                conn.set_progress_handler(None, 0)
+            elapsed_ms = (time.monotonic() - started) * 1000
         
-        conn.close()
-        markdown_table = format_as_markdown_table(data, columns)    
-        print(f"[SQL] Query returned {len(data)} rows")
-        print(markdown_table)
-        return markdown_table
+        stats = f"_Query stats: {elapsed_ms:.1f} ms, {total_rows} result row(s), ~{vm_steps} VM steps"
+        if scanned_rows:
+            stats += f", ~{scanned_rows} rows scanned"
+        stats += "_"
+        if warnings:
+            stats += "\n\n_Warning: " + "; ".join(warnings) + "_"
+        print(f"[SQL] Query returned {total_rows} rows in {elapsed_ms:.1f} ms")
+        result = f"{markdown_table}\n\n{stats}"
+        if is_read_only(normalized):
+            query_cache.put(cache_key, data_version, result)
+        return result
     except Exception as e:
         return f"Error: {str(e)}"
 
+@mcp.tool()
+def get_query_cache_stats() -> Dict[str, Any]:
+    """Report hit/miss statistics for the execute_sql_query result cache.
+    
+    Returns entries, capacity, TTL, hits, misses, stale (invalidated by a data change or TTL),
+    evictions and hit_rate.
+    """
+    print("[SQL] Getting query cache stats")
+    return query_cache.stats()
+
 if __name__ == "__main__":
     mcp.run(transport="sse", port=9009)
\ No newline at end of file
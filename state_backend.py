@@ -0,0 +1,177 @@
+"""Shared state between API worker processes.
+
+Sessions already live in the ``sessions`` table, which every worker reads. What each
+worker does not see on its own are events published by the others: a data change made
+through worker A must reach WebSockets connected to worker B, and a logout on B must
+revoke the session A holds in memory. ``EventBus`` hands every event to a backend:
+
+- ``SqliteBackend`` (default) appends events to an ``events`` table in a WAL database
+  shared by the workers of one host and polls it for rows written by other workers.
+- ``MemoryBackend`` relays through a ``LocalBroker`` in this process. It is enough for a
+  single worker and stands in for an external broker (e.g. Redis pub/sub), which only
+  needs the same ``start``/``publish``/``stop``/``stats`` methods.
+"""
+import asyncio
+import json
+import os
+import secrets
+import time
+
+import aiosqlite
+
+STATE_BACKEND = os.getenv('BMO_STATE_BACKEND', 'sqlite')  # sqlite | memory
+STATE_DB_PATH = os.getenv('BMO_STATE_DB', 'bmo_state.db')
+STATE_POLL_INTERVAL = float(os.getenv('BMO_STATE_POLL_INTERVAL', '0.2'))
+STATE_EVENT_RETENTION = float(os.getenv('BMO_STATE_EVENT_RETENTION', '300'))
+# Seconds between deletions of events older than the retention
+PRUNE_INTERVAL = 30
+
+class LocalBroker:
+    """In-process fan-out between the backends attached to it."""
+
+    def __init__(self):
+        self.backends = set()
+
+    def publish(self, origin, event, token):
+        for backend in list(self.backends):
+            if backend.worker_id != origin:
+                backend.receive(event, token)
+
+class MemoryBackend:
+    def __init__(self, broker=None):
+        self.broker = broker or LocalBroker()
+        self.worker_id = f"{os.getpid()}-{secrets.token_hex(4)}"
+        self._deliver = None
+        self.published = 0
+        self.received = 0
+
+    async def start(self, deliver):
+        """``deliver(event, token)`` is called for every event published by another worker."""
+        self._deliver = deliver
+        self.broker.backends.add(self)
+
+    def publish(self, event, token=None):
+        self.published += 1
+        self.broker.publish(self.worker_id, event, token)
+
+    def receive(self, event, token):
+        self.received += 1
+        self._deliver(event, token)
+
+    async def stop(self):
+        self.broker.backends.discard(self)
+
+    def stats(self):
+        return {"backend": "memory", "worker_id": self.worker_id,
+                "published": self.published, "received": self.received}
+
+class SqliteBackend:
+    def __init__(self, path=STATE_DB_PATH, poll_interval=STATE_POLL_INTERVAL, retention=STATE_EVENT_RETENTION):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.worker_id = f"{os.getpid()}-{secrets.token_hex(4)}"
+        self._conn = None
+        self._deliver = None
+        self._outbox = []
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self._last_id = 0
+        self._last_prune = 0.0
+        self.published = 0
+        self.received = 0
+        self.write_batches = 0
+
+    async def start(self, deliver):
+        """``deliver(event, token)`` is called for every event published by another worker."""
+        self._deliver = deliver
+        self._conn = await aiosqlite.connect(self.path)
+        await self._conn.execute("PRAGMA journal_mode=WAL")
+        await self._conn.execute("PRAGMA synchronous=NORMAL")
+        await self._conn.execute("PRAGMA busy_timeout=5000")
+        await self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                origin TEXT NOT NULL,
+                token TEXT,
+                payload TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+        ''')
+        await self._conn.commit()
+        # Only events published from now on are relayed
+        async with self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM events") as cursor:
+            self._last_id = (await cursor.fetchone())[0]
+        self._tasks = [asyncio.create_task(self._write_loop()), asyncio.create_task(self._poll_loop())]
+        print(f"State backend: sqlite ({self.path}), worker {self.worker_id}")
+
+    def publish(self, event, token=None):
+        """Queue ``event`` for the other workers; written in batches by the writer task."""
+        self.published += 1
+        self._outbox.append((self.worker_id, token, json.dumps(event), time.time()))
+        self._wakeup.set()
+
+    async def _write_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self._write_outbox()
+
+    async def _write_outbox(self):
+        rows, self._outbox = self._outbox, []
+        if not rows:
+            return
+        try:
+            await self._conn.executemany(
+                "INSERT INTO events (origin, token, payload, created) VALUES (?, ?, ?, ?)", rows
+            )
+            await self._conn.commit()
+            self.write_batches += 1
+        except Exception as e:
+            print(f"Failed to write {len(rows)} shared events: {e}")
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self._poll()
+            except Exception as e:
+                print(f"Failed to poll shared events: {e}")
+
+    async def _poll(self):
+        async with self._conn.execute(
+            "SELECT id, origin, token, payload FROM events WHERE id > ? ORDER BY id", (self._last_id,)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        for event_id, origin, token, payload in rows:
+            self._last_id = event_id
+            if origin != self.worker_id:
+                self.received += 1
+                self._deliver(json.loads(payload), token)
+
+        now = time.time()
+        if now - self._last_prune > PRUNE_INTERVAL:
+            self._last_prune = now
+            await self._conn.execute("DELETE FROM events WHERE created < ?", (now - self.retention,))
+            await self._conn.commit()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._conn is not None:
+            await self._write_outbox()
+            await self._conn.close()
+            self._conn = None
+
+    def stats(self):
+        return {"backend": "sqlite", "worker_id": self.worker_id, "published": self.published,
+                "received": self.received, "write_batches": self.write_batches,
+                "pending_writes": len(self._outbox)}
+
+def create_backend(kind=STATE_BACKEND):
+    if kind == "sqlite":
+        return SqliteBackend()
+    if kind == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown state backend: {kind}")
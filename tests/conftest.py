@@ -0,0 +1,77 @@
+"""Shared fixtures: every test session runs against a migrated copy of bmo_data.db.
+
+``pytest_configure`` points ``BMO_DB_PATH`` and ``BMO_STATE_DB`` into a temporary
+directory before any test module imports a project module, so the connection pool and
+``init_database`` never touch the committed database. Importing this module has no side
+effects, so worker processes spawned by tests can import ``FakeSocket`` from it.
+"""
+import atexit
+import os
+import shutil
+import sqlite3
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+DB_PATH = None
+
+def pytest_configure(config):
+    global DB_PATH
+    temp_dir = tempfile.mkdtemp(prefix="bmo-tests-")
+    atexit.register(shutil.rmtree, temp_dir, ignore_errors=True)
+    DB_PATH = os.path.join(temp_dir, "bmo_data.db")
+    shutil.copy(ROOT / "bmo_data.db", DB_PATH)
+    os.environ["BMO_DB_PATH"] = DB_PATH
+    os.environ["BMO_STATE_DB"] = os.path.join(temp_dir, "bmo_state.db")
+    import database
+    database.init_database()
+
+def connect(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+class FakeSocket:
+    """Stands in for a Starlette WebSocket: records sent events and the close code."""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+
+    async def send_json(self, event):
+        self.sent.append(event)
+
+    async def close(self, code):
+        self.closed = code
+
+@pytest.fixture
+def fake_socket():
+    """Factory for ``FakeSocket``s, for tests that need several."""
+    return FakeSocket
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A private copy of the migrated database for tests that write."""
+    path = tmp_path / "bmo_data.db"
+    source, target = sqlite3.connect(DB_PATH), sqlite3.connect(path)
+    source.backup(target)
+    target.close()
+    source.close()
+    return str(path)
+
+@pytest.fixture
+def conn(db_path):
+    conn = connect(db_path)
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def pool(db_path, monkeypatch):
+    """Route ``run_db`` to a private copy of the database."""
+    import database
+    pool = database.ConnectionPool(db_path)
+    monkeypatch.setattr(database, "db_pool", pool)
+    yield pool
+    pool.close()
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+async def hold(admission, user, started, release):
+    async with admission.slot(user):
+        started.append(user)
+        await release.wait()
+
+def test_per_user_limit_queues_only_that_user():
+    async def run():
+        admission = AdmissionController(max_concurrent=4, per_user=1, max_queue=4, user_queue=2)
+        started, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(hold(admission, user, started, release)) for user in ("alice", "alice", "bob")]
+        await asyncio.sleep(0.01)
+        during = list(started), admission.stats()
+        release.set()
+        await asyncio.gather(*tasks)
+        return during, started, admission.stats()
+
+    (started_during, stats_during), started, stats = asyncio.run(run())
+    assert started_during == ["alice", "bob"]
+    assert stats_during["in_flight"] == 2 and stats_during["queue_depth"] == 1
+    assert started == ["alice", "bob", "alice"]
+    assert stats["admitted"] == 3 and stats["in_flight"] == 0
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def run():
+        admission = AdmissionController(max_concurrent=1, per_user=1, max_queue=1, user_queue=2)
+        started, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(hold(admission, user, started, release)) for user in ("alice", "bob")]
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with admission.slot("carol"):
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+        return rejected.value, admission.stats()
+
+    rejected, stats = asyncio.run(run())
+    assert rejected.retry_after >= 1
+    assert stats["rejected"] == 1 and stats["admitted"] == 2
+
+def test_user_queue_share_is_enforced():
+    async def run():
+        admission = AdmissionController(max_concurrent=4, per_user=1, max_queue=10, user_queue=1)
+        started, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(hold(admission, "alice", started, release)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected):
+            async with admission.slot("alice"):
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+def test_queue_timeout_releases_the_wait():
+    async def run():
+        admission = AdmissionController(max_concurrent=1, per_user=1, max_queue=4, user_queue=2, queue_timeout=0.05)
+        started, release = [], asyncio.Event()
+        holder = asyncio.create_task(hold(admission, "alice", started, release))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected, match="Timed out"):
+            async with admission.slot("bob"):
+                pass
+        timed_out = admission.stats()
+        release.set()
+        await holder
+        # The timed-out waiter left no slot or queue entry behind
+        async with admission.slot("bob"):
+            admitted = admission.stats()
+        return timed_out, admitted, admission
+
+    timed_out, admitted, admission = asyncio.run(run())
+    assert timed_out["timeouts"] == 1 and timed_out["queue_depth"] == 0
+    assert admitted["in_flight"] == 1
+    assert admission.stats()["in_flight"] == 0
+    assert admission._users == {}
@@ -0,0 +1,38 @@
+from answer_cache import AnswerCache
+
+RESULT = {"answer": "There are 12 pending reports.", "tool_calls": [], "usage": {}}
+
+def test_exact_and_similar_questions_hit():
+    cache = AnswerCache(similarity=0.9)
+    cache.store("How many reports are pending?", 1, 7, RESULT)
+    entry, score = cache.lookup("how many reports are PENDING", 1, 7)
+    assert entry["result"] == RESULT and score == 1.0
+    entry, score = cache.lookup("Show me how many pending reports there are", 1, 7)
+    assert entry["result"] == RESULT and score >= 0.9
+    assert cache.lookup("How many reports are accepted?", 1, 7) is None
+
+def test_data_version_bump_invalidates():
+    cache = AnswerCache()
+    cache.store("How many reports are pending?", 1, 7, RESULT)
+    assert cache.lookup("How many reports are pending?", 1, 8) is None
+    # Dropped, not just hidden: the old version no longer matches either
+    assert cache.lookup("How many reports are pending?", 1, 7) is None
+    assert cache.stats()["invalidations"] == 1
+
+def test_contextual_questions_bypass_the_cache():
+    cache = AnswerCache()
+    cache.store("What about that bank?", 1, 7, RESULT)
+    assert cache.stats()["entries"] == 0
+    cache.store("How many reports does bank 3 have?", 1, 7, RESULT)
+    assert cache.lookup("How many reports does it have?", 1, 7) is None
+    assert cache.lookup("And the same for bank 3 again?", 1, 7) is None
+    assert cache.stats()["skipped"] == 2
+
+def test_numbers_and_scope_must_match():
+    cache = AnswerCache(similarity=0.5, scope="user")
+    cache.store("Errors of report 41", 1, 7, RESULT)
+    assert cache.lookup("Errors of report 42", 1, 7) is None
+    assert cache.lookup("Errors of report 41", 2, 7) is None
+    shared = AnswerCache(scope="global")
+    shared.store("Errors of report 41", 1, 7, RESULT)
+    assert shared.lookup("Errors of report 41", 2, 7) is not None
@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+
+import repository
+from database import ConnectionPool
+
+def report_ids(conn, has_errors):
+    return [row[0] for row in conn.execute("SELECT id FROM reports WHERE has_errors = ? ORDER BY id", (has_errors,))]
+
+def test_errors_for_reports_match_single_report_calls(conn):
+    ids = report_ids(conn, True)[:5] + report_ids(conn, False)[:2]
+    batch = repository.get_errors_for_reports(conn, ids + ids[:2] + [999999])
+    assert list(batch) == ids + [999999]
+    for report_id in ids:
+        assert batch[report_id] == repository.get_report_errors(conn, report_id)
+    assert batch[999999] == []
+
+def test_status_batch_skips_invalid_updates(conn):
+    with_errors, clean = report_ids(conn, True), report_ids(conn, False)
+    updates = [(clean[0], True), (with_errors[0], True), (with_errors[1], False), (999999, False)]
+    result = repository.update_report_statuses(conn, updates)
+    assert result["updated"] == [clean[0], with_errors[1]]
+    assert [failure["report_id"] for failure in result["failed"]] == [with_errors[0], 999999]
+    assert not conn.in_transaction
+    status = dict(conn.execute("SELECT id, is_accepted FROM reports WHERE id IN (?, ?, ?)",
+                               (clean[0], with_errors[0], with_errors[1])).fetchall())
+    assert status[clean[0]] == 1
+    assert status[with_errors[1]] == 0
+
+def test_comment_batch_returns_inserted_rows(conn):
+    error_ids = [row[0] for row in conn.execute("SELECT id FROM validation_errors ORDER BY id LIMIT 2")]
+    comments = [(error_ids[0], "first"), (999999, "lost"), (error_ids[1], "second"), (error_ids[0], "third")]
+    result = repository.add_error_comments(conn, 1, comments)
+    assert result["added"] == 3
+    assert result["failed"] == [{"error_id": 999999, "error": "Validation error not found"}]
+    assert [(c["error_id"], c["comment"], c["username"]) for c in result["comments"]] == [
+        (error_ids[0], "first", "analyst1"), (error_ids[1], "second", "analyst1"), (error_ids[0], "third", "analyst1"),
+    ]
+    assert not conn.in_transaction
+
+def test_failed_batch_writes_nothing(db_path):
+    pool = ConnectionPool(db_path, size=1)
+    with pool.connection() as conn:
+        clean = report_ids(conn, False)
+        before = dict(conn.execute("SELECT id, is_accepted FROM reports").fetchall())
+        conn.execute(f"""
+            CREATE TRIGGER fail_status BEFORE UPDATE OF is_accepted ON reports
+            WHEN NEW.id = {clean[1]} BEGIN SELECT RAISE(ABORT, 'boom'); END
+        """)
+    with pytest.raises(sqlite3.IntegrityError, match="boom"):
+        with pool.connection() as conn:
+            repository.update_report_statuses(conn, [(report_id, not before[report_id]) for report_id in clean[:3]])
+    with pool.connection() as conn:
+        assert dict(conn.execute("SELECT id, is_accepted FROM reports").fetchall()) == before
+    pool.close()
@@ -0,0 +1,45 @@
+"""Async BMO tools share one pooled client, so concurrent calls overlap on the network."""
+import asyncio
+import time
+
+import httpx
+
+import bmo_mcp_server
+from http_client import AsyncApiClient
+
+DELAY = 0.2
+CALLS = 10
+
+def delayed_api(seen):
+    async def handler(request):
+        seen.append(request.headers["Authorization"])
+        await asyncio.sleep(DELAY)
+        return httpx.Response(200, json={"path": request.url.path})
+    return handler
+
+def test_concurrent_tools_take_about_one_call(monkeypatch):
+    seen = []
+    api = AsyncApiClient("http://bmo.test")
+    api._client = httpx.AsyncClient(base_url=api.base_url, transport=httpx.MockTransport(delayed_api(seen)))
+    monkeypatch.setattr(bmo_mcp_server, "api", api)
+
+    async def run():
+        calls = []
+        for i in range(CALLS):
+            if i % 2:
+                calls.append(bmo_mcp_server.get_report_errors.fn(report_id=i, auth_token=f"token-{i}"))
+            else:
+                calls.append(bmo_mcp_server.get_banks.fn(auth_token=f"token-{i}"))
+        started = time.perf_counter()
+        results = await asyncio.gather(*calls)
+        elapsed = time.perf_counter() - started
+        await api._client.aclose()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(run())
+    assert [result["path"] for result in results][:2] == ["/api/banks", "/api/reports/1/errors"]
+    assert sorted(seen) == sorted(f"Bearer token-{i}" for i in range(CALLS))
+    # Sequential calls would take CALLS * DELAY
+    assert elapsed < DELAY * 2.5, f"{CALLS} concurrent calls took {elapsed:.2f}s"
+    metrics = api.metrics.snapshot()
+    assert metrics["GET /api/banks"]["calls"] == CALLS // 2
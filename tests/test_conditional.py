@@ -0,0 +1,49 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import database
+import repository
+from conditional import conditional_get, etag_matches
+
+ETAG = 'W/"0123456789abcdef0123"'
+
+def test_weak_and_strong_tags_match():
+    assert etag_matches(ETAG, ETAG)
+    assert etag_matches('"0123456789abcdef0123"', ETAG)
+    assert not etag_matches('W/"ffffffffffffffffffff"', ETAG)
+    assert not etag_matches(None, ETAG)
+    assert not etag_matches("", ETAG)
+
+def test_tag_lists_and_wildcard():
+    assert etag_matches(f'W/"other", {ETAG}', ETAG)
+    assert etag_matches(f'"other",W/"0123456789abcdef0123"', ETAG)
+    assert not etag_matches('W/"other", "another"', ETAG)
+    assert etag_matches("*", ETAG)
+
+def test_conditional_get_answers_304_until_a_write(pool):
+    app = FastAPI()
+    loads = []
+
+    @app.get("/api/banks")
+    async def banks(request: Request):
+        async def load():
+            loads.append(1)
+            return await database.run_db(repository.list_banks)
+        return await conditional_get(request, ("banks",), load)
+
+    client = TestClient(app)
+    first = client.get("/api/banks")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.json()
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    repeat = client.get("/api/banks", headers={"If-None-Match": etag})
+    assert repeat.status_code == 304 and repeat.content == b""
+    assert len(loads) == 1
+    # Another URL never shares the tag
+    assert client.get("/api/banks?x=1", headers={"If-None-Match": etag}).status_code == 200
+
+    with pool.connection() as conn:
+        repository.create_bank(conn, "999999999", "Conditional Bank")
+    changed = client.get("/api/banks", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
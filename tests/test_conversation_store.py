@@ -0,0 +1,58 @@
+import asyncio
+import sqlite3
+
+from conversation_store import ConversationStore
+
+def stored_threads(path):
+    conn = sqlite3.connect(path)
+    threads = [row[0] for row in conn.execute("SELECT thread_id FROM thread_activity ORDER BY last_used")]
+    conn.close()
+    return threads
+
+def test_sqlite_history_is_not_capped(tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+
+    async def run():
+        store = ConversationStore("sqlite", path, max_threads=2)
+        await store.open()
+        for thread_id in ("t1", "t2", "t1", "t3"):
+            await store.touch(thread_id)
+        stats = store.stats()
+        await store.close()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stored_threads(path) == ["t2", "t1", "t3"]
+    assert stats["evicted"] == 0 and stats["threads"] == 3
+
+def test_purge_sees_threads_of_other_workers(tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+
+    async def run():
+        first, second = ConversationStore("sqlite", path, ttl=60), ConversationStore("sqlite", path, ttl=60)
+        await first.open()
+        await second.open()
+        await first.touch("idle")
+        await first.touch("active")
+        await first._conn.execute("UPDATE thread_activity SET last_used = last_used - 120 WHERE thread_id = 'idle'")
+        await first._conn.commit()
+        await second.purge_expired()
+        expired = second.expired
+        await first.close()
+        await second.close()
+        return expired
+
+    assert asyncio.run(run()) == 1
+    assert stored_threads(path) == ["active"]
+
+def test_memory_backend_evicts_least_recently_used():
+    async def run():
+        store = ConversationStore("memory", max_threads=2)
+        await store.open()
+        for thread_id in ("t1", "t2", "t1", "t3"):
+            await store.touch(thread_id)
+        return list(store._threads), store.stats()
+
+    threads, stats = asyncio.run(run())
+    assert threads == ["t1", "t3"]
+    assert stats["evicted"] == 1 and stats["threads"] == 2
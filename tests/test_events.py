@@ -0,0 +1,35 @@
+import asyncio
+
+from events import EventBus
+
+def test_seq_counts_per_socket(fake_socket):
+    async def run():
+        bus = EventBus()
+        alice, bob = fake_socket(), fake_socket()
+        bus.subscribe(alice, "alice")
+        bus.subscribe(bob, "bob")
+        bus.publish({"type": "reports_updated"})
+        bus.publish({"type": "chat_token"}, token="alice")
+        bus.publish({"type": "chat_token"}, token="alice")
+        bus.publish({"type": "bank_deleted"})
+        await asyncio.sleep(0.05)
+        return alice, bob
+
+    alice, bob = asyncio.run(run())
+    assert [event["seq"] for event in alice.sent] == [1, 2, 3, 4]
+    assert [event["seq"] for event in bob.sent] == [1, 2]
+    assert [event["type"] for event in bob.sent] == ["reports_updated", "bank_deleted"]
+
+def test_overflowing_socket_is_evicted(fake_socket):
+    async def run():
+        bus = EventBus(queue_size=2)
+        socket = fake_socket()
+        bus.subscribe(socket, "alice")
+        for _ in range(3):
+            bus.publish({"type": "reports_updated"})
+        await asyncio.sleep(0.05)
+        return bus, socket
+
+    bus, socket = asyncio.run(run())
+    assert socket.closed == 1013
+    assert bus.stats()["subscribers"] == 0
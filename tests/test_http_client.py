@@ -0,0 +1,54 @@
+import asyncio
+
+import httpx
+
+from http_client import AsyncApiClient
+
+def etag_api(calls):
+    """Serves one body per path with a fixed ETag, answering 304 to a matching If-None-Match."""
+    async def handler(request):
+        calls.append(request.headers.get("if-none-match"))
+        etag = f'W/"{request.url.path}"'
+        if request.headers.get("if-none-match") == etag:
+            await asyncio.sleep(0.05)
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(200, headers={"ETag": etag}, json={"path": request.url.path})
+    return handler
+
+def client(calls, cache_size):
+    api = AsyncApiClient("http://bmo.test", etag_cache_size=cache_size)
+    api._client = httpx.AsyncClient(base_url=api.base_url, transport=httpx.MockTransport(etag_api(calls)))
+    return api
+
+def test_not_modified_replays_the_cached_body():
+    calls = []
+
+    async def run():
+        api = client(calls, 8)
+        first = await api.request("GET", "/api/banks")
+        second = await api.request("GET", "/api/banks")
+        await api.aclose()
+        return first, second, api.etags.stats()
+
+    first, second, stats = asyncio.run(run())
+    assert calls == [None, 'W/"/api/banks"']
+    assert second.status_code == 200 and second.json() == first.json() == {"path": "/api/banks"}
+    assert stats["not_modified"] == 1
+
+def test_entry_evicted_during_revalidation_still_answers():
+    calls = []
+
+    async def run():
+        api = client(calls, 1)
+        await api.request("GET", "/api/banks")
+        # The revalidation is in flight while another request evicts its entry
+        revalidation = asyncio.create_task(api.request("GET", "/api/banks"))
+        await asyncio.sleep(0.01)
+        await api.request("GET", "/api/reports")
+        response = await revalidation
+        await api.aclose()
+        return response
+
+    response = asyncio.run(run())
+    assert response.status_code == 200
+    assert response.json() == {"path": "/api/banks"}
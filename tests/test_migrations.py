@@ -0,0 +1,29 @@
+import sqlite3
+
+import database
+
+def test_init_database_applies_every_migration_once(db_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", db_path)
+    database.init_database()
+    database.init_database()
+    conn = sqlite3.connect(db_path)
+    versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versions == [version for version, _, _ in database.MIGRATIONS]
+
+def test_fresh_database_gets_the_full_schema(tmp_path, monkeypatch):
+    path = str(tmp_path / "fresh.db")
+    monkeypatch.setattr(database, "DATABASE_PATH", path)
+    database.init_database()
+    conn = sqlite3.connect(path)
+    assert database.get_schema_version(conn) == database.MIGRATIONS[-1][0]
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_reports_submission", "idx_validation_errors_report", "idx_error_comments_error"} <= indexes
+
+def test_writes_bump_table_versions(conn):
+    before = database.get_table_versions(conn)
+    conn.execute("INSERT INTO banks (aba_code, name) VALUES ('999999999', 'Version Bank')")
+    conn.commit()
+    after = database.get_table_versions(conn)
+    assert after["banks"] == before["banks"] + 1
+    assert after["reports"] == before["reports"]
+    assert database.get_data_version(conn) == sum(after.values())
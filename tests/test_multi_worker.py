@@ -0,0 +1,177 @@
+"""Two API worker processes sharing one database and one state database.
+
+Each worker wires ``SessionStore`` and ``EventBus`` the way main.py does and is driven
+through a command queue, so the test can log in on one worker and check the effect on
+the other. The races between two workers' session stores are replayed in-process with
+two ``SessionStore`` instances on one database.
+"""
+import asyncio
+import multiprocessing
+import os
+import sqlite3
+import time
+
+import pytest
+
+from conftest import FakeSocket
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPLY_TIMEOUT = 15
+# Longer than the state backend's poll interval
+RELAY_WAIT = 0.5
+USER = {"id": 1, "username": "analyst1", "role": "analyst"}
+
+# Project modules are imported inside the functions: spawned workers import this module
+# before they have pointed BMO_DB_PATH at the test database.
+
+def worker(db_path, state_path, commands, replies):
+    os.environ["BMO_DB_PATH"] = db_path
+    os.environ["BMO_STATE_DB"] = state_path
+    os.environ["BMO_STATE_POLL_INTERVAL"] = "0.05"
+    import asyncio
+    import sys
+    sys.path.insert(0, ROOT)
+    import repository
+    from database import run_db
+    from events import EventBus
+    from sessions import SessionStore
+    from state_backend import create_backend
+
+    async def serve():
+        sessions = SessionStore()
+        events = EventBus(backend=create_backend("sqlite"))
+        socket = FakeSocket()
+
+        async def revoke_session(event, token):
+            sessions.forget(token)
+            await events.disconnect(token)
+
+        events.on("session_revoked", revoke_session)
+        await sessions.start()
+        await events.start()
+        loop = asyncio.get_running_loop()
+        while True:
+            command, arg = await loop.run_in_executor(None, commands.get)
+            if command == "login":
+                session = await sessions.create(await run_db(repository.find_user, arg))
+                replies.put(session.token)
+            elif command == "auth":
+                session = await sessions.get(arg)
+                replies.put(session.username if session else None)
+            elif command == "subscribe":
+                events.subscribe(socket, arg)
+                replies.put(True)
+            elif command == "publish":
+                events.publish({"type": "reports_updated", "reports": [{"id": 1, "is_accepted": False}]})
+                replies.put(True)
+            elif command == "logout":
+                await sessions.remove(arg)
+                events.publish({"type": "session_revoked"}, token=arg)
+                replies.put(True)
+            elif command == "socket":
+                await asyncio.sleep(RELAY_WAIT)
+                replies.put(([event["type"] for event in socket.sent], socket.closed))
+            elif command == "stop":
+                await events.stop()
+                await sessions.stop()
+                replies.put(True)
+                return
+
+    asyncio.run(serve())
+
+@pytest.fixture
+def workers(db_path, tmp_path):
+    context = multiprocessing.get_context("spawn")
+    state_path = str(tmp_path / "bmo_state.db")
+    channels = {}
+    for name in ("A", "B"):
+        commands, replies = context.Queue(), context.Queue()
+        process = context.Process(target=worker, args=(db_path, state_path, commands, replies), daemon=True)
+        process.start()
+        channels[name] = (process, commands, replies)
+
+    def ask(name, command, arg=None):
+        _, commands, replies = channels[name]
+        commands.put((command, arg))
+        return replies.get(timeout=REPLY_TIMEOUT)
+
+    yield ask
+    for name, (process, commands, _) in channels.items():
+        if process.is_alive():
+            ask(name, "stop")
+        process.join(timeout=REPLY_TIMEOUT)
+
+def test_sessions_and_events_cross_workers(workers, db_path):
+    ask = workers
+    token = ask("A", "login", "analyst1")
+    assert ask("B", "auth", token) == "analyst1"
+
+    ask("A", "subscribe", token)
+    ask("B", "publish")
+    sent, closed = ask("A", "socket")
+    assert sent == ["reports_updated"]
+    assert closed is None
+
+    ask("B", "logout", token)
+    sent, closed = ask("A", "socket")
+    assert closed == 1000
+    assert ask("A", "auth", token) is None
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT expires_at FROM sessions WHERE token = ?", (token,)).fetchone()[0] == 0
+    conn.close()
+
+def test_stale_copy_defers_to_the_table(pool):
+    """Worker A's copy has expired, but worker B kept the session alive meanwhile."""
+    from sessions import SessionStore
+
+    async def run():
+        a = SessionStore(ttl=0.5, flush_interval=3600)
+        b = SessionStore(ttl=0.5, flush_interval=3600)
+        record = await a.create(USER)
+        await asyncio.sleep(0.3)
+        await b.get(record.token)
+        await b.flush()
+        await asyncio.sleep(0.3)
+        stale = a._sessions[record.token].expires_at <= time.time()
+        session = await a.get(record.token)
+        return stale, session, a.stats()
+
+    stale, session, stats = asyncio.run(run())
+    assert stale
+    assert session is not None and session.username == "analyst1"
+    assert stats["expired"] == 0 and stats["loaded_from_db"] == 1
+
+def test_flush_restores_a_purged_session(pool):
+    """Worker B purged the row before worker A wrote the activity that extends it."""
+    import repository
+    from sessions import SessionStore
+
+    async def run():
+        a = SessionStore(flush_interval=3600)
+        record = await a.create(USER)
+        await a.get(record.token)
+        with pool.connection() as conn:
+            repository.purge_expired_sessions(conn, record.expires_at + 1)
+            purged = repository.get_session(conn, record.token, time.time())
+        await a.flush()
+        with pool.connection() as conn:
+            return purged, repository.get_session(conn, record.token, time.time())
+
+    purged, restored = asyncio.run(run())
+    assert purged is None
+    assert restored["username"] == "analyst1"
+
+def test_flush_does_not_revive_a_revoked_session(pool):
+    from sessions import SessionStore
+
+    async def run():
+        a = SessionStore(flush_interval=3600)
+        b = SessionStore(flush_interval=3600)
+        record = await a.create(USER)
+        await a.get(record.token)
+        await b.remove(record.token)
+        await a.flush()
+        a.forget(record.token)
+        return await a.get(record.token)
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,48 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from prompt_window import PromptWindow
+
+def turn(n, result_chars=2000):
+    call_id = f"call-{n}"
+    return [
+        HumanMessage(content=f"question {n}", id=f"h{n}"),
+        AIMessage(content="", id=f"a{n}", tool_calls=[{"name": "get_reports", "args": {"page": n}, "id": call_id}]),
+        ToolMessage(content=f"rows for {n}\n" + "x" * result_chars, name="get_reports", tool_call_id=call_id, id=f"t{n}"),
+        AIMessage(content=f"answer {n}", id=f"r{n}"),
+    ]
+
+def assert_paired(messages):
+    calls = {call["id"] for message in messages if message.type == "ai" for call in message.tool_calls}
+    results = {message.tool_call_id for message in messages if message.type == "tool"}
+    assert calls == results
+    assert messages[0].type == "human"
+
+def test_earlier_tool_results_are_collapsed():
+    messages = turn(1) + turn(2) + turn(3)
+    window = PromptWindow(max_turns=6, max_tokens=100000, tool_chars=600).window(messages)
+    assert [message.id for message in window] == [message.id for message in messages]
+    tools = [message for message in window if message.type == "tool"]
+    assert all(len(message.content) < 600 and "omitted" in message.content for message in tools[:2])
+    # The current turn's result is sent in full
+    assert tools[-1].content == messages[-2].content
+    assert_paired(window)
+
+def test_turn_and_token_limits_drop_whole_turns():
+    messages = [message for n in range(10) for message in turn(n, result_chars=200)]
+    window = PromptWindow(max_turns=3, max_tokens=100000, tool_chars=600).window(messages)
+    assert window[0].id == "h7"
+    assert_paired(window)
+
+    tight = PromptWindow(max_turns=10, max_tokens=150, tool_chars=50).window(messages)
+    assert tight[0].id == "h9"
+    assert len(tight) == 4
+    assert_paired(tight)
+
+def test_trim_records_per_thread_stats():
+    prompt_window = PromptWindow(max_turns=1, max_tokens=100000)
+    messages = turn(1) + turn(2)
+    result = prompt_window.trim({"messages": messages}, {"configurable": {"thread_id": "t"}})
+    assert result["llm_input_messages"][0].id == "h2"
+    stats = prompt_window.pop_turn_stats("t")
+    assert stats["model_calls"] == 1 and stats["tokens_saved"] > 0
+    assert prompt_window.pop_turn_stats("t")["model_calls"] == 0
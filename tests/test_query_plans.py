@@ -0,0 +1,75 @@
+"""Every query the API runs through repository.py must be answered from an index.
+
+Each case runs a repository function with SQLite's trace callback recording the
+statements it executes, then checks ``EXPLAIN QUERY PLAN`` of every statement for full
+scans and temporary sort trees on the large tables.
+"""
+import re
+
+import pytest
+
+import repository
+
+# Table names and the aliases repository.py gives them
+LARGE_TABLES = {"reports", "r", "validation_errors", "ve", "error_comments", "ec"}
+
+def traced_statements(conn, func, *args, **kwargs):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        func(conn, *args, **kwargs)
+    except repository.ConflictError:
+        pass
+    finally:
+        conn.set_trace_callback(None)
+    conn.rollback()
+    return [sql for sql in statements if re.match(r"\s*(SELECT|UPDATE|DELETE|INSERT)", sql, re.I)]
+
+def plan_problems(conn, sql):
+    problems = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        detail = row["detail"]
+        match = re.match(r"SCAN (\w+)", detail)
+        if match and match.group(1) in LARGE_TABLES and "USING" not in detail:
+            problems.append(detail)
+        if detail.startswith("USE TEMP B-TREE FOR ORDER BY"):
+            problems.append(detail)
+    return problems
+
+def first_page_cursor(conn, **filters):
+    return repository.list_reports(conn, limit=5, **filters)["next_cursor"]
+
+def some_id(conn, sql):
+    return conn.execute(sql).fetchone()[0]
+
+CASES = {
+    "list_reports": lambda conn: (repository.list_reports, (), {"limit": 5}),
+    "list_reports with cursor": lambda conn: (
+        repository.list_reports, (), {"limit": 5, "cursor": first_page_cursor(conn)}),
+    "list_reports by status": lambda conn: (repository.list_reports, (), {"limit": 5, "status": "pending"}),
+    "list_reports by status with cursor": lambda conn: (
+        repository.list_reports, (), {"limit": 5, "status": "pending",
+                                      "cursor": first_page_cursor(conn, status="pending")}),
+    "list_reports by aba_code": lambda conn: (
+        repository.list_reports, (), {"limit": 5, "aba_code": some_id(conn, "SELECT aba_code FROM banks")}),
+    "list_reports by bank_id": lambda conn: (
+        repository.list_reports, (), {"limit": 5, "bank_id": some_id(conn, "SELECT id FROM banks")}),
+    "get_errors_for_reports": lambda conn: (
+        repository.get_errors_for_reports,
+        ([row[0] for row in conn.execute("SELECT id FROM reports LIMIT 5")],), {}),
+    "list_error_comments": lambda conn: (
+        repository.list_error_comments, (some_id(conn, "SELECT error_id FROM error_comments"),), {"limit": 2}),
+    "list_error_comments with cursor": lambda conn: (
+        repository.list_error_comments, (some_id(conn, "SELECT error_id FROM error_comments"),),
+        {"limit": 2, "cursor": "1"}),
+    "delete_bank": lambda conn: (repository.delete_bank, (some_id(conn, "SELECT bank_id FROM reports"),), {}),
+    "list_banks": lambda conn: (repository.list_banks, (), {}),
+}
+
+@pytest.mark.parametrize("case", list(CASES))
+def test_query_uses_indexes(conn, case):
+    func, args, kwargs = CASES[case](conn)
+    statements = traced_statements(conn, func, *args, **kwargs)
+    assert statements, f"{case} ran no queries"
+    for sql in statements:
+        assert not plan_problems(conn, sql), f"{case}: {sql.strip()}"
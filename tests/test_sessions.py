@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import repository
+from sessions import SessionStore
+
+USER = {"id": 1, "username": "analyst1", "role": "analyst"}
+
+def stored(pool, token):
+    with pool.connection() as conn:
+        return repository.get_session(conn, token, time.time())
+
+def test_session_survives_restart(pool):
+    async def run():
+        store = SessionStore(flush_interval=3600)
+        await store.start()
+        record = await store.create(USER)
+        await store.stop()
+
+        restarted = SessionStore(flush_interval=3600)
+        await restarted.start()
+        session = await restarted.get(record.token)
+        await restarted.stop()
+        return record, session, restarted.stats()
+
+    record, session, stats = asyncio.run(run())
+    assert (session.token, session.user_id, session.username, session.role) == (record.token, 1, "analyst1", "analyst")
+    assert stats["hits"] == 1 and stats["loaded_from_db"] == 0
+
+def test_activity_is_written_on_flush(pool):
+    async def run():
+        store = SessionStore(ttl=60, flush_interval=3600)
+        await store.start()
+        record = await store.create(USER)
+        created_expiry = stored(pool, record.token)["expires_at"]
+        await asyncio.sleep(0.01)
+        await store.get(record.token)
+        before_flush = stored(pool, record.token)["expires_at"]
+        await store.flush()
+        after_flush = stored(pool, record.token)["expires_at"]
+        await store.stop()
+        return created_expiry, before_flush, after_flush
+
+    created_expiry, before_flush, after_flush = asyncio.run(run())
+    assert before_flush == created_expiry
+    assert after_flush > created_expiry
+
+def test_evicted_session_is_reloaded(pool):
+    async def run():
+        store = SessionStore(max_sessions=2, flush_interval=3600)
+        await store.start()
+        first = await store.create(USER)
+        await store.create(USER)
+        await store.create(USER)
+        in_memory = store.stats()["sessions"]
+        session = await store.get(first.token)
+        await store.stop()
+        return first, in_memory, session, store.stats()
+
+    first, in_memory, session, stats = asyncio.run(run())
+    assert in_memory == 2
+    assert session.user_id == first.user_id
+    assert stats["loaded_from_db"] == 1
+
+def test_expired_and_removed_sessions_are_rejected(pool):
+    async def run():
+        store = SessionStore(ttl=0.05, flush_interval=3600)
+        await store.start()
+        expiring = await store.create(USER)
+        await asyncio.sleep(0.1)
+        expired = await store.get(expiring.token)
+        store.ttl = 60
+        removed = await store.create(USER)
+        await store.remove(removed.token)
+        after_remove = await store.get(removed.token)
+        forgotten = await store.create(USER)
+        store.forget(forgotten.token)
+        # forget() only drops memory; the row is still there for another worker's logout to delete
+        reloaded = await store.get(forgotten.token)
+        missing = await store.get(None)
+        await store.stop()
+        return expired, after_remove, reloaded, missing, removed
+
+    expired, after_remove, reloaded, missing, removed = asyncio.run(run())
+    assert expired is None and after_remove is None and missing is None
+    assert reloaded is not None
+    assert stored(pool, removed.token) is None
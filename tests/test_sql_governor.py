@@ -0,0 +1,46 @@
+"""Query governor: full-scan and nested-loop estimates from EXPLAIN QUERY PLAN."""
+import pytest
+
+import sql_mcp_server
+from sql_mcp_server import QueryRejected, check_query_plan
+
+ROWS = 9000
+
+@pytest.fixture
+def plan_conn(conn):
+    conn.execute("CREATE TABLE a (id INTEGER PRIMARY KEY, x INTEGER)")
+    conn.execute("CREATE TABLE b (id INTEGER PRIMARY KEY, a_id INTEGER, y INTEGER)")
+    conn.executemany("INSERT INTO a (id, x) VALUES (?, ?)", [(i, i % 7) for i in range(1, ROWS + 1)])
+    conn.executemany("INSERT INTO b (id, a_id, y) VALUES (?, ?, ?)", [(i, i, i % 5) for i in range(1, ROWS + 1)])
+    conn.commit()
+    return conn
+
+def test_single_scan_below_threshold_is_not_flagged(plan_conn):
+    warnings, scanned = check_query_plan(plan_conn, "SELECT * FROM a")
+    assert warnings == []
+    assert scanned == ROWS
+
+def test_cross_join_multiplies_scans(plan_conn, monkeypatch):
+    monkeypatch.setattr(sql_mcp_server, "QUERY_GUARD_MODE", "warn")
+    warnings, scanned = check_query_plan(plan_conn, "SELECT * FROM a, b")
+    assert scanned == ROWS * ROWS
+    assert any(warning.startswith("nested scans of a") for warning in warnings)
+
+def test_cross_join_rejected(plan_conn, monkeypatch):
+    monkeypatch.setattr(sql_mcp_server, "QUERY_GUARD_MODE", "reject")
+    with pytest.raises(QueryRejected, match="nested scans"):
+        check_query_plan(plan_conn, "SELECT * FROM a, b")
+
+def test_indexed_join_is_not_multiplied(plan_conn, monkeypatch):
+    monkeypatch.setattr(sql_mcp_server, "QUERY_GUARD_MODE", "reject")
+    warnings, scanned = check_query_plan(plan_conn, "SELECT * FROM b JOIN a ON a.id = b.a_id")
+    assert warnings == []
+    assert scanned == ROWS
+
+def test_correlated_subquery_runs_per_outer_row(plan_conn, monkeypatch):
+    monkeypatch.setattr(sql_mcp_server, "QUERY_GUARD_MODE", "warn")
+    warnings, scanned = check_query_plan(
+        plan_conn, "SELECT id, (SELECT COUNT(*) FROM b WHERE b.y = a.x) FROM a"
+    )
+    assert scanned >= ROWS * ROWS
+    assert any("correlated subquery" in warning for warning in warnings)
@@ -0,0 +1,51 @@
+import repository
+
+def counted(conn):
+    """report_stats columns recomputed with COUNT over the data tables."""
+    return {row["bank_id"]: dict(row) for row in conn.execute("""
+        SELECT b.id AS bank_id,
+               COUNT(r.id) AS reports,
+               COUNT(r.id) FILTER (WHERE r.is_accepted IS NULL) AS pending,
+               COUNT(r.id) FILTER (WHERE r.is_accepted IS 1) AS accepted,
+               COUNT(r.id) FILTER (WHERE r.is_accepted IS 0) AS rejected,
+               COUNT(r.id) FILTER (WHERE r.has_errors IS 1) AS with_errors,
+               (SELECT COUNT(*) FROM validation_errors ve JOIN reports r2 ON r2.id = ve.report_id
+                WHERE r2.bank_id = b.id) AS errors
+        FROM banks b LEFT JOIN reports r ON r.bank_id = b.id
+        GROUP BY b.id
+    """)}
+
+def maintained(conn):
+    return {row["bank_id"]: dict(row) for row in conn.execute(
+        "SELECT bank_id, reports, pending, accepted, rejected, with_errors, errors FROM report_stats"
+    )}
+
+def test_migrated_counters_match_counts(conn):
+    assert maintained(conn) == counted(conn)
+
+def test_triggers_follow_writes(conn):
+    banks = [row[0] for row in conn.execute("SELECT id FROM banks ORDER BY id LIMIT 2")]
+    clean = conn.execute("SELECT id FROM reports WHERE has_errors = 0 LIMIT 1").fetchone()[0]
+    flagged = conn.execute("SELECT id FROM reports WHERE has_errors = 1 LIMIT 1").fetchone()[0]
+    report_id = conn.execute(
+        "INSERT INTO reports (bank_id, report_code, submission_date, has_errors, is_accepted) VALUES (?, 'STATS-1', '2024-01-01', 0, NULL)",
+        (banks[0],)
+    ).lastrowid
+    conn.execute("INSERT INTO validation_errors (report_id, error_type, error_message) VALUES (?, 'Stats', 'x')", (report_id,))
+    conn.execute("UPDATE reports SET has_errors = 1, is_accepted = 0 WHERE id = ?", (report_id,))
+    conn.execute("UPDATE reports SET bank_id = ? WHERE id = ?", (banks[1], report_id))
+    conn.execute("UPDATE reports SET is_accepted = 0 WHERE id IN (?, ?)", (clean, flagged))
+    conn.execute("DELETE FROM validation_errors WHERE report_id = ?", (flagged,))
+    conn.commit()
+    assert maintained(conn) == counted(conn)
+
+def test_decisions_add_up_to_total(conn):
+    clean = conn.execute("SELECT id FROM reports WHERE has_errors = 0 LIMIT 1").fetchone()[0]
+    conn.execute("UPDATE reports SET is_accepted = 0 WHERE id = ?", (clean,))
+    conn.commit()
+    stats = repository.get_report_statistics(conn)
+    reports = stats["reports"]
+    assert reports["pending"] + reports["accepted"] + reports["rejected"] == reports["total"]
+    assert reports["rejected"] == conn.execute("SELECT COUNT(*) FROM reports WHERE is_accepted = 0").fetchone()[0]
+    for bank in stats["by_bank"]:
+        assert bank["pending"] + bank["accepted"] + bank["rejected"] == bank["reports"]
@@ -1,9 +1,9 @@
 # Internal FR - Source Code
-import requests
 from fastmcp import FastMCP, Client
 from typing import Dict, Any, List, Union
 import os
 import inspect
+from http_client import ApiClient
 
 mcp = FastMCP("BMO MCP Server")
 
@@ -11,6 +11,8 @@ BASE_URL = os.getenv('BASE_URL')
 
 print(f"BASE_URL: {BASE_URL}")
 
+api = ApiClient(BASE_URL, verify=False)
+
 def call_api(url_path, http_method, query_params, payload) -> Union[Dict[str, Any], None]:
     """
     Call an API with the given parameters and return the JSON response.
@@ -21,24 +23,17 @@ def call_api(url_path, http_method, query_params, payload) -> Union[Dict[str, An
     :param payload: The payload to send in the request body (for POST, PUT, etc.).
     :return: The JSON response from the API.
     """
-    # Construct the full URL
-    full_url = f"{BASE_URL}{url_path}"
-
-    print(f"*** Calling URL: {full_url}")
+    print(f"*** Calling URL: {BASE_URL}{url_path}")
     print(f"*** query_params: {query_params}")
 
     headers = {
     }
     
     # Choose the appropriate request method
-    if http_method == 'get':
-        response = requests.get(full_url, params=query_params, headers=headers, verify=False)
-    elif http_method == 'post':
-        response = requests.post(full_url, params=query_params, json=payload, headers=headers, verify=False)
-    elif http_method == 'put':
-        response = requests.put(full_url, params=query_params, json=payload, headers=headers, verify=False)
-    elif http_method == 'delete':
-        response = requests.delete(full_url, params=query_params, headers=headers, verify=False)
+    if http_method in ('get', 'delete'):
+        response = api.request(http_method, url_path, params=query_params, headers=headers)
+    elif http_method in ('post', 'put'):
+        response = api.request(http_method, url_path, params=query_params, json=payload, headers=headers)
     else:
         raise ValueError(f"Unsupported HTTP method: {http_method}")
     